@@ -1,38 +1,60 @@
 import tkinter as tk
 from tkinter import messagebox, simpledialog
-import os
+from task_runner import TaskRunner
+from instrument import STARTED, callback, interactive
+from accounts import DEFAULT_ACCOUNT, TransactionError, load_default_service
+
+STARTUP_BUDGET_MS = 500
 
 class ATM:
     def __init__(self, master):
         self.master = master
         self.master.title("ATM Machine")
-        self.master.geometry("400x500")
+        self.master.geometry("400x600")
         self.master.configure(bg="#2196F3")
 
-        self.pin_file = "pin.txt"
-        self.balance_file = "balance.txt"
-
-        if os.path.exists(self.pin_file):
-            with open(self.pin_file, "r") as file:
-                self.pin = int(file.read().strip())
-        else:
-            self.pin = 1234
-
-        if os.path.exists(self.balance_file):
-            with open(self.balance_file, "r") as file:
-                self.balance = float(file.read().strip())
-        else:
-            self.balance = 1000.0
-
+        self.service = None
+        self.account = None
         self.is_authenticated = False
-        self.minimum_withdrawal = 500.0
+        self.minimum_withdrawal = None
+        self.ready = False
+
+        # Account operations run on a worker thread; rule violations come back as TransactionError
+        self.runner = TaskRunner(self.master, on_error=self.failed)
+        self.master.protocol("WM_DELETE_WINDOW", self.close)
         
         self.create_widgets()
+        # Opening the service can hash PINs (first run, or a plaintext accounts.txt), so it is built on
+        # the worker and Login stays disabled until it is ready
+        self.runner.submit(self.start_service, on_done=self.service_ready, on_error=self.service_failed)
+        self.master.after_idle(lambda: interactive("startup.atm", STARTED, STARTUP_BUDGET_MS))
+
+    def start_service(self):
+        # Assigned here as well as in service_ready so close() can release it even if the window
+        # closes before the result is delivered
+        self.service = load_default_service()
+        return self.service
+
+    def service_ready(self, service):
+        self.minimum_withdrawal = service.minimum_withdrawal
+        self.ready = True
+        self.login_label.config(text="Login", state=tk.NORMAL)
+
+    def service_failed(self, error):
+        self.login_label.config(text="Unavailable")
+        messagebox.showerror("Error", f"Could not open the accounts: {error}")
 
     def create_widgets(self):
         self.title_label = tk.Label(self.master, text="Welcome to Your Bank", bg="#2196F3", fg="white", font=("Arial", 18, "bold"))
         self.title_label.pack(pady=20)
 
+        self.account_label = tk.Label(self.master, text="Account number:", bg="#2196F3", fg="white", font=("Arial", 14))
+        self.account_label.pack(pady=5)
+
+        self.account_entry = tk.Entry(self.master, font=("Arial", 14))
+        self.account_entry.insert(0, DEFAULT_ACCOUNT)
+        self.account_entry.pack(pady=5)
+
         self.pin_label = tk.Label(self.master, text="Enter your PIN:", bg="#2196F3", fg="white", font=("Arial", 14))
         self.pin_label.pack(pady=10)
 
@@ -40,20 +62,20 @@ class ATM:
         self.pin_entry.pack(pady=10)
 
         self.login_label = self.create_label("Login", self.authenticate_user, "black", "gray")
+        self.login_label.config(text="Starting...", state=tk.DISABLED)
         self.login_label.pack(pady=10)
 
+        # The action labels are only needed after login, so they are built then
         self.action_buttons = []
+
+    def create_action_buttons(self):
         self.action_buttons.append(self.create_label("Show Balance", self.show_balance, "black", "gray"))
         self.action_buttons.append(self.create_label("Deposit", self.deposit, "black", "gray"))
         self.action_buttons.append(self.create_label("Withdraw", self.withdraw, "black", "gray"))
         self.action_buttons.append(self.create_label("Transfer", self.transfer, "black", "gray"))
         self.action_buttons.append(self.create_label("Change PIN", self.change_pin, "black", "gray"))
         self.action_buttons.append(self.create_label("Reset", self.reset, "black", "gray"))
-        self.action_buttons.append(self.create_label("Exit", self.master.quit, "black", "gray"))
-
-        for button in self.action_buttons:
-            button.pack(pady=10)
-            button.pack_forget()
+        self.action_buttons.append(self.create_label("Exit", self.close, "black", "gray"))
 
     def create_label(self, text, command, bg_color, hover_color):
         label = tk.Label(self.master, text=text, bg=bg_color, fg="white", width=20, height=2, font=("Arial", 12), relief="raised")
@@ -62,78 +84,97 @@ class ATM:
         label.bind("<Leave>", lambda e: label.config(bg=bg_color))
         return label
 
+    @callback("atm.authenticate_user")
     def authenticate_user(self):
+        if not self.ready:
+            return
+        account_number = self.account_entry.get().strip()
         entered_pin = self.pin_entry.get()
-        if entered_pin.isdigit() and int(entered_pin) == self.pin:
+        # PIN hashing is deliberately slow, so it runs on the worker rather than the Tk loop
+        self.runner.submit(lambda: self.service.authenticate(account_number, entered_pin),
+                           on_done=lambda ok: self.authenticated(account_number, ok))
+
+    def authenticated(self, account_number, ok):
+        if ok:
+            self.account = account_number
             self.is_authenticated = True
             self.pin_label.config(text="Authentication successful.")
             self.pin_entry.config(state=tk.DISABLED)
+            self.account_entry.config(state=tk.DISABLED)
+            if not self.action_buttons:
+                self.create_action_buttons()
             for button in self.action_buttons:
                 button.pack()
 
         else:
             messagebox.showerror("Error", "Incorrect PIN. Please try again.")
 
+    @callback("atm.show_balance")
     def show_balance(self):
-        messagebox.showinfo("Current Balance", f"Your current balance is: ₹{self.balance:.2f}")
+        # Reading the balance may catch up on ledger entries from other processes, so it is not done on the Tk loop
+        self.runner.submit(lambda: self.service.balance(self.account), on_done=self.balance_shown, key="balance")
+
+    def balance_shown(self, balance):
+        messagebox.showinfo("Current Balance", f"Your current balance is: ₹{balance:.2f}")
 
+    @callback("atm.change_pin")
     def change_pin(self):
         original_pin_str = simpledialog.askstring("Change PIN", "Enter your current PIN:")
-        if original_pin_str and original_pin_str.isdigit() and int(original_pin_str) == self.pin:
-            new_pin_str = simpledialog.askstring("Change PIN", "Enter new 4-digit PIN:")
-            if new_pin_str and new_pin_str.isdigit() and len(new_pin_str) == 4:
-                self.pin = int(new_pin_str)
-                with open(self.pin_file, "w") as file:
-                    file.write(str(self.pin))
-                messagebox.showinfo("Success", "PIN changed successfully.")
-            else:
-                messagebox.showerror("Error", "Invalid PIN. Please enter a 4-digit number.")
+        if original_pin_str:
+            self.runner.submit(lambda: self.service.authenticate(self.account, original_pin_str),
+                               on_done=lambda ok: self.current_pin_checked(original_pin_str, ok))
         else:
             messagebox.showerror("Error", "Incorrect current PIN. Please try again.")
 
+    def current_pin_checked(self, original_pin_str, ok):
+        if not ok:
+            messagebox.showerror("Error", "Incorrect current PIN. Please try again.")
+            return
+        new_pin_str = simpledialog.askstring("Change PIN", "Enter new 4-digit PIN:")
+        if new_pin_str and self.service.validate_pin(new_pin_str):
+            # change_pin checks the current PIN again; the session cache makes that check cheap
+            self.runner.submit(lambda: self.service.change_pin(self.account, original_pin_str, new_pin_str),
+                               on_done=lambda result: messagebox.showinfo("Success", "PIN changed successfully."))
+        else:
+            messagebox.showerror("Error", "Invalid PIN. Please enter a 4-digit number.")
+
+    @callback("atm.deposit")
     def deposit(self):
         amount = self.get_amount("Enter amount to deposit:")
         if amount is not None:
-            self.balance += amount
-            with open(self.balance_file, "w") as file:
-                file.write(str(self.balance))
-            messagebox.showinfo("Success", f"₹{amount:.2f} deposited successfully.")
-            self.show_balance()
+            self.runner.submit(lambda: self.service.deposit(self.account, amount),
+                               on_done=lambda balance: self.completed(f"₹{amount:.2f} deposited successfully."))
 
+    @callback("atm.withdraw")
     def withdraw(self):
         amount = self.get_amount("Enter amount to withdraw:")
         if amount is not None:
-            if amount < self.minimum_withdrawal:
-                messagebox.showerror("Error", f"Minimum withdrawal amount is ₹{self.minimum_withdrawal:.2f}.")
-            elif self.balance - amount < 0:
-                messagebox.showerror("Error", "Insufficient funds for withdrawal.")
-            else:
-                self.balance -= amount
-                with open(self.balance_file, "w") as file:
-                    file.write(str(self.balance))
-                messagebox.showinfo("Success", f"₹{amount:.2f} withdrawn successfully.")
-                self.show_balance()
+            self.runner.submit(lambda: self.service.withdraw(self.account, amount),
+                               on_done=lambda balance: self.completed(f"₹{amount:.2f} withdrawn successfully."))
 
+    @callback("atm.transfer")
     def transfer(self):
         account_number = simpledialog.askstring("Input", "Enter the account number to transfer to:")
         if account_number and self.validate_account_number(account_number):
             amount = self.get_amount("Enter amount to transfer:")
             if amount is not None:
-                if amount < self.minimum_withdrawal:
-                    messagebox.showerror("Error", f"Minimum transfer amount is ₹{self.minimum_withdrawal:.2f}.")
-                elif self.balance - amount < 0:
-                    messagebox.showerror("Error", "Insufficient funds for transfer.")
-                else:
-                    self.balance -= amount
-                    with open(self.balance_file, "w") as file:
-                        file.write(str(self.balance))
-                    messagebox.showinfo("Success", f"₹{amount:.2f} transferred to account {account_number} successfully.")
-                    self.show_balance()
+                self.runner.submit(lambda: self.service.transfer(self.account, account_number, amount),
+                                   on_done=lambda balance: self.completed(f"₹{amount:.2f} transferred to account {account_number} successfully."))
         else:
             messagebox.showerror("Error", "Invalid account number. Please enter a valid account number.")
 
+    def completed(self, message):
+        messagebox.showinfo("Success", message)
+        self.show_balance()
+
+    def failed(self, error):
+        if isinstance(error, TransactionError):
+            messagebox.showerror("Error", str(error))
+        else:
+            messagebox.showerror("Error", f"Could not save: {error}")
+
     def validate_account_number(self, account_number):
-        return account_number.isdigit()
+        return self.service.validate_account_number(account_number)
 
     def get_amount(self, prompt):
         amount_str = simpledialog.askstring("Input", prompt)
@@ -148,16 +189,18 @@ class ATM:
                 return None
         return None
 
+    def close(self):
+        self.runner.close()
+        if self.service is not None:
+            self.service.close()
+        self.master.destroy()
+
+    @callback("atm.reset")
     def reset(self):
         confirm = messagebox.askyesno("Confirm Reset", "Are you sure you want to reset everything to default values?")
         if confirm:
-            self.pin = 1234
-            self.balance = 1000.0
-            with open(self.pin_file, "w") as file:
-                file.write(str(self.pin))
-            with open(self.balance_file, "w") as file:
-                file.write(str(self.balance))
-            messagebox.showinfo("Reset Successful", "All values have been reset to default.")
+            self.runner.submit(lambda: self.service.reset(self.account),
+                               on_done=lambda balance: messagebox.showinfo("Reset Successful", "All values have been reset to default."))
 
 if __name__ == "__main__":
     root = tk.Tk()
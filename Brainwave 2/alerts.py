@@ -0,0 +1,147 @@
+import argparse
+import os
+import sys
+import time
+from collections import namedtuple
+
+from inventory_db import InventoryDB, DB_PATH, LOW_STOCK_THRESHOLD
+from instrument import timed, count
+
+ALERT_LOG = "alerts.log"
+BATCH_SIZE = 10000
+REORDER_MULTIPLE = 2
+
+Alert = namedtuple("Alert", ["time", "item_id", "name", "supplier", "quantity", "threshold"])
+
+class AlertEngine:
+    # Low-stock alerts driven by the item_changes log that triggers on items fill in. Each batch of
+    # changes is evaluated against the item's reorder_level, else its category's threshold, else
+    # LOW_STOCK_THRESHOLD; an alert fires when an item enters the low_stock set, not while it stays
+    # there. Consumed changes are deleted in the same transaction that updates low_stock, and alerts
+    # are appended to the log and fsynced before that commit, so a crash repeats alerts rather than
+    # losing them.
+    def __init__(self, db, log_path=ALERT_LOG, batch_size=BATCH_SIZE):
+        self.db = db
+        self.log_path = log_path
+        self.batch_size = batch_size
+
+    @timed("alerts.process_batch")
+    def process_batch(self):
+        # Returns the alerts raised and whether more changes are waiting
+        conn = self.db.connection()
+        rows = conn.execute('''SELECT c.seq, c.item_id, i.quantity, i.name, i.supplier,
+                                      IFNULL(i.reorder_level, IFNULL(t.threshold, ?)), l.item_id IS NOT NULL
+                               FROM item_changes c
+                               LEFT JOIN items i ON i.id = c.item_id
+                               LEFT JOIN category_thresholds t ON t.category = IFNULL(i.category, '')
+                               LEFT JOIN low_stock l ON l.item_id = c.item_id
+                               ORDER BY c.seq LIMIT ?''', (LOW_STOCK_THRESHOLD, self.batch_size)).fetchall()
+        if not rows:
+            return [], False
+
+        now = time.time()
+        alerts = []
+        low = {}
+        # Judge each item once, on its current quantity, so a restock later in the batch cancels an earlier dip
+        latest = {row[1]: row for row in rows}
+        for seq, item_id, quantity, name, supplier, threshold, was_low in latest.values():
+            # Deleted items have no name; they leave low_stock without an alert
+            is_low = name is not None and quantity is not None and quantity <= threshold
+            if is_low and not was_low:
+                alerts.append(Alert(now, item_id, name, supplier, quantity, threshold))
+            low[item_id] = is_low
+
+        self.append(alerts)
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO low_stock (item_id) VALUES (?)", [(item_id,) for item_id, is_low in low.items() if is_low])
+            conn.executemany("DELETE FROM low_stock WHERE item_id = ?", [(item_id,) for item_id, is_low in low.items() if not is_low])
+            conn.execute("DELETE FROM item_changes WHERE seq <= ?", (rows[-1][0],))
+        count("alerts.changes", len(rows))
+        count("alerts.raised", len(alerts))
+        return alerts, len(rows) == self.batch_size
+
+    def process_all(self, on_alerts=None):
+        raised = 0
+        while True:
+            alerts, more = self.process_batch()
+            raised += len(alerts)
+            if alerts and on_alerts:
+                on_alerts(alerts)
+            if not more:
+                return raised
+
+    @timed("file.alerts_append")
+    def append(self, alerts):
+        if not alerts:
+            return
+        with open(self.log_path, "a", encoding="utf-8") as file:
+            for alert in alerts:
+                file.write(f"{alert.time:.3f}\t{alert.item_id}\t{alert.name}\t{alert.supplier}\t{alert.quantity}\t{alert.threshold}\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def set_category_threshold(self, category, threshold):
+        # Re-check the category's items under the new threshold; this reads only that category
+        conn = self.db.connection()
+        with conn:
+            if threshold is None:
+                conn.execute("DELETE FROM category_thresholds WHERE category = ?", (category,))
+            else:
+                conn.execute("INSERT OR REPLACE INTO category_thresholds (category, threshold) VALUES (?, ?)", (category, threshold))
+            conn.execute("INSERT INTO item_changes (item_id, quantity) SELECT id, quantity FROM items WHERE IFNULL(category, '') = ?", (category,))
+
+    def set_reorder_level(self, item_id, level):
+        # The item_changes trigger logs the change, so the item is re-checked on the next batch
+        conn = self.db.connection()
+        with conn:
+            conn.execute("UPDATE items SET reorder_level = ? WHERE id = ?", (level, item_id))
+        self.db.cache.invalidate(item_id)
+
+    @timed("alerts.suggestions")
+    def suggestions(self):
+        # Items currently in low_stock, grouped by supplier, with enough to bring each to twice its threshold
+        rows = self.db.connection().execute('''SELECT i.supplier, i.id, i.name, i.quantity, IFNULL(i.reorder_level, IFNULL(t.threshold, ?))
+                                               FROM low_stock l
+                                               JOIN items i ON i.id = l.item_id
+                                               LEFT JOIN category_thresholds t ON t.category = IFNULL(i.category, '')
+                                               ORDER BY i.supplier, i.name''', (LOW_STOCK_THRESHOLD,)).fetchall()
+        grouped = {}
+        for supplier, item_id, name, quantity, threshold in rows:
+            order = max(threshold * REORDER_MULTIPLE - quantity, 1)
+            grouped.setdefault(supplier, []).append((item_id, name, quantity, threshold, order))
+        return grouped
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Process pending inventory changes into low-stock alerts.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--log", default=ALERT_LOG)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--category-threshold", nargs=2, metavar=("CATEGORY", "THRESHOLD"), help="set a category threshold first")
+    parser.add_argument("--reorder-level", nargs=2, metavar=("ITEM_ID", "LEVEL"),
+                        help="set an item's reorder level first; LEVEL 'none' falls back to its category threshold")
+    parser.add_argument("--suggest", action="store_true", help="print reorder suggestions by supplier")
+    args = parser.parse_args(argv)
+
+    db = InventoryDB(args.db)
+    db.init_schema()
+    engine = AlertEngine(db, args.log, args.batch_size)
+    try:
+        if args.category_threshold:
+            engine.set_category_threshold(args.category_threshold[0], int(args.category_threshold[1]))
+        if args.reorder_level:
+            item_id, level = args.reorder_level
+            engine.set_reorder_level(int(item_id), None if level == "none" else int(level))
+        started = time.perf_counter()
+        raised = engine.process_all()
+        print(f"Raised {raised} alerts in {(time.perf_counter() - started) * 1000:.1f} ms.")
+        if args.suggest:
+            for supplier, items in engine.suggestions().items():
+                print(f"{supplier}:")
+                for item_id, name, quantity, threshold, order in items:
+                    print(f"  {name} (id {item_id}): {quantity} in stock, threshold {threshold}, order {order}")
+        return 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import argparse
+import csv
+import json
+import os
+import sys
+
+from inventory_db import InventoryDB, Item, validate_item
+from instrument import timed
+
+FIELDS = ("name", "quantity", "price", "category", "description", "supplier")
+BATCH_SIZE = 10000
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension == ".jsonl":
+        return "jsonl"
+    if extension == ".json":
+        return "json"
+    raise ValueError(f"Cannot tell the format of {path}; use --format csv, jsonl or json.")
+
+# Readers yield raw records and parsers turn one into a dict, so a bad record is rejected on its own
+# instead of ending the import
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as file:
+        yield from csv.DictReader(file)
+
+def parse_csv(record):
+    return record
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield line
+
+def parse_jsonl(line):
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError("Expected a JSON object.")
+    return record
+
+def read_legacy_json(path):
+    # inventory.json is {name: {quantity, price}}; it has no streaming form so it is loaded whole
+    with open(path, encoding="utf-8") as file:
+        data = json.load(file)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} is not an inventory.json object.")
+    yield from data.items()
+
+def parse_legacy_json(record):
+    name, values = record
+    if not isinstance(values, dict):
+        raise ValueError(f"Expected an object for {name}.")
+    return {"name": name,
+            "quantity": values.get("quantity"),
+            "price": values.get("price"),
+            "category": values.get("category", "Uncategorized"),
+            "description": values.get("description", "Imported from inventory.json"),
+            "supplier": values.get("supplier", "Unknown")}
+
+READERS = {"csv": (read_csv, parse_csv), "jsonl": (read_jsonl, parse_jsonl), "json": (read_legacy_json, parse_legacy_json)}
+
+@timed("file.import_items")
+def import_items(db, path, fmt=None, upsert=False, batch_size=BATCH_SIZE, progress=None, on_error=None):
+    read, parse = READERS[fmt or detect_format(path)]
+    records = read(path)
+    write = db.bulk_upsert if upsert else db.bulk_insert
+    imported = rejected = 0
+    batch = {} if upsert else []
+
+    for number, record in enumerate(records, start=1):
+        try:
+            record = parse(record)
+            row = validate_item(*(record.get(field) for field in FIELDS))
+        except ValueError as e:
+            rejected += 1
+            if on_error:
+                on_error(number, str(e))
+            continue
+
+        if upsert:
+            # The last occurrence of a name within a batch wins
+            batch.pop(row[0], None)
+            batch[row[0]] = row
+        else:
+            batch.append(row)
+
+        if len(batch) >= batch_size:
+            write(list(batch.values()) if upsert else batch)
+            imported += len(batch)
+            batch.clear()
+            if progress:
+                progress(imported, rejected)
+
+    if batch:
+        write(list(batch.values()) if upsert else batch)
+        imported += len(batch)
+    if progress:
+        progress(imported, rejected)
+    return imported, rejected
+
+def write_csv(file, items):
+    writer = csv.writer(file)
+    writer.writerow(Item._fields)
+    for item in items:
+        writer.writerow(item)
+        yield
+
+def write_jsonl(file, items):
+    for item in items:
+        file.write(json.dumps(item._asdict()) + "\n")
+        yield
+
+def write_legacy_json(file, items):
+    file.write("{")
+    for index, item in enumerate(items):
+        if index:
+            file.write(", ")
+        file.write(f"{json.dumps(item.name)}: {json.dumps({'quantity': item.quantity, 'price': item.price})}")
+        yield
+    file.write("}")
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "json": write_legacy_json}
+
+@timed("file.export_items")
+def export_items(db, path, fmt=None, batch_size=BATCH_SIZE, progress=None):
+    writer = WRITERS[fmt or detect_format(path)]
+    exported = 0
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        for _ in writer(file, db.iter_items(batch_size=batch_size)):
+            exported += 1
+            if progress and exported % batch_size == 0:
+                progress(exported)
+    if progress:
+        progress(exported)
+    return exported
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import or export inventory items.")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=sorted(READERS), help="defaults to the file extension")
+    parser.add_argument("--upsert", action="store_true", help="update items that already exist with the same name")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--db", default="inventory.db")
+    args = parser.parse_args(argv)
+
+    db = InventoryDB(args.db)
+    db.init_schema()
+    try:
+        if args.action == "import":
+            imported, rejected = import_items(
+                db, args.path, args.format, args.upsert, args.batch_size,
+                progress=lambda done, bad: print(f"{done} imported, {bad} rejected", file=sys.stderr),
+                on_error=lambda number, message: print(f"record {number}: {message}", file=sys.stderr))
+            print(f"Imported {imported} items, rejected {rejected}.")
+            return 1 if rejected else 0
+        exported = export_items(db, args.path, args.format, args.batch_size,
+                                progress=lambda done: print(f"{done} exported", file=sys.stderr))
+        print(f"Exported {exported} items.")
+        return 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
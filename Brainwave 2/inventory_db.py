@@ -0,0 +1,391 @@
+import argparse
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrument import timed
+import migrations
+from migrations import LOW_STOCK_THRESHOLD, SUMMARY_COLUMNS
+from item_cache import ItemCache
+
+DB_PATH = 'inventory.db'
+
+Item = namedtuple("Item", ["id", "name", "quantity", "price", "category", "description", "supplier"])
+
+ITEM_COLUMNS = ", ".join(f"items.{field}" for field in Item._fields)
+
+SORT_COLUMNS = ("id", "name", "quantity", "price", "category", "supplier")
+# Older rows may hold NULL here; they are sorted, compared and indexed as '' so keyset paging can step past them
+NULLABLE_COLUMNS = ("category", "supplier")
+
+# SQLite stores integers as signed 64-bit
+MAX_QUANTITY = 2 ** 63 - 1
+
+def sort_expression(column):
+    # Qualified because a text search joins items_fts, which has its own name column
+    return f"IFNULL(items.{column}, '')" if column in NULLABLE_COLUMNS else f"items.{column}"
+
+def make_item(cursor, row):
+    return Item(*row)
+
+def validate_item(name, quantity, price, category, description, supplier):
+    fields = (name, quantity, price, category, description, supplier)
+    if any(field is None or str(field) == "" for field in fields):
+        raise ValueError("All fields are required!")
+
+    try:
+        # int() would truncate a JSON 1.9 to 1, and True would pass as 1
+        if isinstance(quantity, bool) or isinstance(price, bool):
+            raise ValueError
+        if isinstance(quantity, float) and not quantity.is_integer():
+            raise ValueError
+        quantity = int(quantity)
+        price = float(price)
+        if not 0 <= quantity <= MAX_QUANTITY or price < 0 or not math.isfinite(price):
+            raise ValueError
+    except (ValueError, OverflowError):
+        raise ValueError("Quantity must be a positive integer and Price a positive number!")
+    return str(name), quantity, price, str(category), str(description), str(supplier)
+
+def same_summary(expected, actual):
+    if expected is None or actual is None:
+        return expected == actual
+    count, quantity, value, low_stock = expected
+    return ((count, quantity, low_stock) == (actual[0], actual[1], actual[3])
+            and abs(value - actual[2]) <= 1e-6 * max(1.0, abs(value)))
+
+def fts_phrase(text):
+    # Every word becomes a quoted prefix term so user input can't break the MATCH syntax
+    return " ".join('"' + word.replace('"', '""') + '"*' for word in text.split())
+
+class ItemQuery:
+    def __init__(self, text="", category="", supplier="", min_price=None, max_price=None, sort="id", descending=False):
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort}")
+        self.text = text.strip()
+        self.category = category
+        self.supplier = supplier
+        self.min_price = min_price
+        self.max_price = max_price
+        self.sort = sort
+        self.descending = descending
+
+    def is_default(self):
+        return (not self.text and not self.category and not self.supplier and self.min_price is None
+                and self.max_price is None and self.sort == "id" and not self.descending)
+
+    def key(self, row):
+        if self.sort == "id":
+            return (row.id,)
+        value = getattr(row, self.sort)
+        if value is None and self.sort in NULLABLE_COLUMNS:
+            value = ""
+        return (value, row.id)
+
+    def source(self):
+        # A text search is driven from the FTS side. In id order it walks the index in rowid order and
+        # stops after one page however many items match; in any other order the matches are joined and
+        # sorted, which still skips building the list an IN (SELECT rowid ...) filter would.
+        return "items_fts JOIN items ON items.id = items_fts.rowid" if self.text else "items"
+
+    def id_column(self):
+        return "items_fts.rowid" if self.text else "id"
+
+    def filters(self, matches=None):
+        # matches maps category and supplier to (the values their prefix matches, whether that is broad),
+        # as worked out by InventoryDB.prefix_matches
+        matches = matches or {}
+        clauses, params = [], []
+        if self.text:
+            clauses.append("items_fts MATCH ?")
+            params.append(fts_phrase(self.text))
+        for column, prefix in (("category", self.category), ("supplier", self.supplier)):
+            if not prefix:
+                continue
+            values, broad = matches.get(column, (None, False))
+            # A broad match is filtered row by row (the unary + keeps it off its index) so the sort
+            # column's index drives; a single value becomes an equality the (column, price) index serves
+            expression = ("+" if broad else "") + sort_expression(column)
+            if values is not None and len(values) == 1:
+                clauses.append(f"{expression} = ?")
+                params.append(values[0])
+            else:
+                # Prefix matches written as ranges so they stay on the column indexes
+                clauses.append(f"{expression} >= ? AND {expression} < ?")
+                params += [prefix, prefix + "\U0010ffff"]
+        if self.min_price is not None:
+            clauses.append("price >= ?")
+            params.append(self.min_price)
+        if self.max_price is not None:
+            clauses.append("price <= ?")
+            params.append(self.max_price)
+        return clauses, params
+
+    def key_clause(self, operator, row):
+        key = list(self.key(row))
+        if self.sort == "id":
+            return f"{self.id_column()} {operator} ?", key
+        # The plain bound on the sort column lets SQLite seek an expression index; the row value alone scans it
+        column = sort_expression(self.sort)
+        return f"{column} {operator[0]}= ? AND ({column}, items.id) {operator} (?, ?)", [key[0], *key]
+
+    def order_by(self, reverse=False):
+        direction = "DESC" if self.descending != reverse else "ASC"
+        if self.sort == "id":
+            return f"{self.id_column()} {direction}"
+        return f"{sort_expression(self.sort)} {direction}, items.id {direction}"
+
+DEFAULT_QUERY = ItemQuery()
+
+class InventoryDB:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+        # Rows read by the paging queries stay typed in memory so editing a row needs no lookup
+        self.cache = ItemCache()
+        self.cache_version = None
+
+    def connection(self):
+        # One long-lived connection per thread; the GUI thread and any worker each keep their own
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, cached_statements=256, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA cache_size=-20000")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self.local.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    def close(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+        self.local = threading.local()
+
+    @timed("sql.init_schema")
+    def init_schema(self, backfill=True):
+        # Brings the file up to the latest migration; once it is current this is a couple of reads.
+        # With backfill=False pending row backfills are left for backfill_chunk() to work through.
+        migrations.migrate(self.connection(), backfill=backfill)
+
+    @timed("sql.backfill_chunk")
+    def backfill_chunk(self):
+        return migrations.backfill_chunk(self.connection())
+
+    @timed("sql.data_version")
+    def data_version(self):
+        version = self.connection().execute("PRAGMA data_version").fetchone()[0]
+        if version != self.cache_version:
+            # Another connection committed; any cached row may be out of date
+            self.cache.clear()
+            self.cache_version = version
+        return version
+
+    def query_items(self, sql, params=()):
+        cursor = self.connection().cursor()
+        cursor.row_factory = make_item
+        return cursor.execute(sql, params).fetchall()
+
+    def prefix_matches(self, query, limit):
+        # Resolves the category and supplier prefixes against the summary tables. Reading a page in sort
+        # order while filtering costs about limit * total / matched rows; reading every match through
+        # the prefix's index and sorting costs matched rows, so a prefix is broad when the first is cheaper.
+        matches = {}
+        total = None
+        conn = self.connection()
+        for column, prefix in (("category", query.category), ("supplier", query.supplier)):
+            if not prefix:
+                continue
+            rows = conn.execute(f"SELECT {column}, item_count FROM {column}_summary WHERE {column} >= ? AND {column} < ?",
+                                (prefix, prefix + "\U0010ffff")).fetchall()
+            matched = sum(item_count for _, item_count in rows)
+            if total is None:
+                total = self.summary_totals()[0]
+            broad = query.sort != column and matched * matched > limit * total
+            matches[column] = ([value for value, _ in rows], broad)
+        return matches
+
+    @timed("sql.fetch_page")
+    def fetch_page(self, query=DEFAULT_QUERY, after=None, before=None, limit=100, remember=True):
+        # Keyset pagination on (sort column, id) so a page costs the same wherever it sits in the result
+        clauses, params = query.filters(self.prefix_matches(query, limit))
+        reverse = before is not None
+        if after is not None:
+            clause, key = query.key_clause("<" if query.descending else ">", after)
+            clauses.append(clause)
+            params += key
+        elif before is not None:
+            clause, key = query.key_clause(">" if query.descending else "<", before)
+            clauses.append(clause)
+            params += key
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.query_items(f"SELECT {ITEM_COLUMNS} FROM {query.source()} {where} ORDER BY {query.order_by(reverse)} LIMIT ?",
+                                (*params, limit))
+        if remember:
+            self.cache.put_many(rows)
+        return rows[::-1] if reverse else rows
+
+    @timed("sql.fetch_range")
+    def fetch_range(self, query=DEFAULT_QUERY, first=None, last=None, limit=300):
+        clauses, params = query.filters(self.prefix_matches(query, limit))
+        if first is not None:
+            clause, key = query.key_clause("<=" if query.descending else ">=", first)
+            clauses.append(clause)
+            params += key
+        if last is not None:
+            clause, key = query.key_clause(">=" if query.descending else "<=", last)
+            clauses.append(clause)
+            params += key
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.query_items(f"SELECT {ITEM_COLUMNS} FROM {query.source()} {where} ORDER BY {query.order_by()} LIMIT ?",
+                                (*params, limit))
+        self.cache.put_many(rows)
+        return rows
+
+    @timed("sql.get_item")
+    def get_item(self, item_id):
+        record = self.cache.get(item_id)
+        if record is not None:
+            return Item(*record.as_tuple())
+        rows = self.query_items(f"SELECT {ITEM_COLUMNS} FROM items WHERE id = ?", (item_id,))
+        self.cache.put_many(rows)
+        return rows[0] if rows else None
+
+    @timed("sql.find_by_name")
+    def find_by_name(self, name):
+        # The cache's name index first; data_version drops it if another connection has written
+        self.data_version()
+        record = self.cache.get_by_name(name)
+        if record is not None:
+            return Item(*record.as_tuple())
+        rows = self.query_items(f"SELECT {ITEM_COLUMNS} FROM items WHERE name = ? LIMIT 1", (name,))
+        self.cache.put_many(rows)
+        return rows[0] if rows else None
+
+    @timed("sql.add_item")
+    def add_item(self, name, quantity, price, category, description, supplier):
+        # Imports match rows to items by name, so a second item with the same name could never be updated
+        if self.find_by_name(name) is not None:
+            raise ValueError(f"An item named '{name}' already exists!")
+        conn = self.connection()
+        with conn:
+            cursor = conn.execute("INSERT INTO items (name, quantity, price, category, description, supplier, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                  (name, quantity, price, category, description, supplier, time.time()))
+        row = Item(cursor.lastrowid, name, quantity, price, category, description, supplier)
+        self.cache.put(row)
+        return row
+
+    @timed("sql.update_item")
+    def update_item(self, item_id, name, quantity, price, category, description, supplier):
+        conn = self.connection()
+        with conn:
+            conn.execute("UPDATE items SET name=?, quantity=?, price=?, category=?, description=?, supplier=?, updated_at=? WHERE id=?",
+                         (name, quantity, price, category, description, supplier, time.time(), item_id))
+        row = Item(item_id, name, quantity, price, category, description, supplier)
+        self.cache.put(row)
+        return row
+
+    @timed("sql.delete_item")
+    def delete_item(self, item_id):
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM items WHERE id=?", (item_id,))
+        self.cache.invalidate(item_id)
+
+    def iter_items(self, batch_size=1000):
+        after = None
+        while True:
+            # Streaming every row through the cache would only evict the ones on screen
+            rows = self.fetch_page(after=after, limit=batch_size, remember=False)
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            after = rows[-1]
+
+    @timed("sql.bulk_insert")
+    def bulk_insert(self, rows):
+        conn = self.connection()
+        now = time.time()
+        with conn:
+            conn.executemany("INSERT INTO items (name, quantity, price, category, description, supplier, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             [(*row, now) for row in rows])
+
+    @timed("sql.bulk_upsert")
+    def bulk_upsert(self, rows):
+        # Matched by name: existing rows are updated, the rest inserted, all in one transaction
+        conn = self.connection()
+        now = time.time()
+        with conn:
+            conn.executemany("UPDATE items SET quantity=?, price=?, category=?, description=?, supplier=?, updated_at=? WHERE name=?",
+                             [(*row[1:], now, row[0]) for row in rows])
+            conn.executemany("INSERT INTO items (name, quantity, price, category, description, supplier, updated_at) "
+                             "SELECT ?, ?, ?, ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM items WHERE name=?)",
+                             [(*row, now, row[0]) for row in rows])
+        self.cache.invalidate_names(row[0] for row in rows)
+
+    @timed("sql.summary")
+    def summary(self, column):
+        if column not in SUMMARY_COLUMNS:
+            raise ValueError(f"No summary by {column}")
+        return self.connection().execute(f"SELECT {column}, item_count, total_quantity, total_value, low_stock_count "
+                                         f"FROM {column}_summary ORDER BY total_value DESC").fetchall()
+
+    @timed("sql.summary_totals")
+    def summary_totals(self):
+        return self.connection().execute("SELECT IFNULL(SUM(item_count), 0), IFNULL(SUM(total_quantity), 0), "
+                                         "IFNULL(SUM(total_value), 0), IFNULL(SUM(low_stock_count), 0) "
+                                         "FROM category_summary").fetchone()
+
+    @timed("sql.rebuild_summaries")
+    def rebuild_summaries(self):
+        # Recomputes the summaries from items with a full scan and reports where the maintained ones disagreed
+        conn = self.connection()
+        mismatches = []
+        with conn:
+            for column in SUMMARY_COLUMNS:
+                expected = {row[0]: row[1:] for row in conn.execute(
+                    f"SELECT IFNULL({column}, ''), COUNT(*), SUM(quantity), SUM(quantity * price), SUM(quantity <= ?) "
+                    f"FROM items GROUP BY IFNULL({column}, '')", (LOW_STOCK_THRESHOLD,))}
+                actual = {row[0]: row[1:] for row in conn.execute(
+                    f"SELECT {column}, item_count, total_quantity, total_value, low_stock_count FROM {column}_summary")}
+                for key in sorted(expected.keys() | actual.keys()):
+                    if not same_summary(expected.get(key), actual.get(key)):
+                        mismatches.append((column, key, expected.get(key), actual.get(key)))
+
+                conn.execute(f"DELETE FROM {column}_summary")
+                conn.executemany(f"INSERT INTO {column}_summary ({column}, item_count, total_quantity, total_value, low_stock_count) "
+                                 f"VALUES (?, ?, ?, ?, ?)", [(key, *values) for key, values in expected.items()])
+        return mismatches
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inventory database maintenance.")
+    parser.add_argument("command", choices=["rebuild-summaries"])
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args(argv)
+
+    db = InventoryDB(args.db)
+    db.init_schema()
+    try:
+        mismatches = db.rebuild_summaries()
+        for column, key, expected, actual in mismatches:
+            print(f"{column} {key!r}: expected {expected}, summary had {actual}")
+        print(f"Summaries rebuilt; {len(mismatches)} inconsistent row(s) corrected.")
+        return 1 if mismatches else 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
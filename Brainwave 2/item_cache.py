@@ -0,0 +1,89 @@
+import sys
+import threading
+from collections import OrderedDict
+
+from instrument import count
+
+CACHE_SIZE = 10000
+
+class CachedItem:
+    # One typed record per item with no per-row dict; repeated category and supplier strings are interned
+    __slots__ = ("id", "name", "quantity", "price", "category", "description", "supplier")
+
+    def __init__(self, id, name, quantity, price, category, description, supplier):
+        self.id = id
+        self.name = name
+        self.quantity = quantity
+        self.price = price
+        self.category = sys.intern(category) if category else category
+        self.description = description
+        self.supplier = sys.intern(supplier) if supplier else supplier
+
+    def as_tuple(self):
+        return (self.id, self.name, self.quantity, self.price, self.category, self.description, self.supplier)
+
+class ItemCache:
+    # Least recently used items by id, with a name index. Shared by the Tk thread and the worker.
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.items = OrderedDict()
+        self.names = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, item_id):
+        with self.lock:
+            record = self.items.get(item_id)
+            if record is not None:
+                self.items.move_to_end(item_id)
+        count("cache.hit" if record is not None else "cache.miss")
+        return record
+
+    def get_by_name(self, name):
+        # Names are not unique in items; this finds the most recently cached item with the name
+        with self.lock:
+            item_id = self.names.get(name)
+            record = self.items.get(item_id) if item_id is not None else None
+            if record is not None:
+                self.items.move_to_end(item_id)
+        count("cache.hit" if record is not None else "cache.miss")
+        return record
+
+    def put(self, row):
+        self.put_many((row,))
+
+    def put_many(self, rows):
+        with self.lock:
+            for row in rows:
+                old = self.items.pop(row[0], None)
+                if old is not None and self.names.get(old.name) == old.id:
+                    del self.names[old.name]
+                record = CachedItem(*row)
+                self.items[record.id] = record
+                self.names[record.name] = record.id
+            while len(self.items) > self.size:
+                _, evicted = self.items.popitem(last=False)
+                if self.names.get(evicted.name) == evicted.id:
+                    del self.names[evicted.name]
+
+    def invalidate(self, item_id):
+        with self.lock:
+            record = self.items.pop(item_id, None)
+            if record is not None and self.names.get(record.name) == record.id:
+                del self.names[record.name]
+
+    def invalidate_names(self, names):
+        # Names are not unique, so every cached row with one of the names goes, not just the indexed one
+        names = set(names)
+        with self.lock:
+            for item_id in [item_id for item_id, record in self.items.items() if record.name in names]:
+                del self.items[item_id]
+            for name in names:
+                self.names.pop(name, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.names.clear()
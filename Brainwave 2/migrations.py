@@ -0,0 +1,247 @@
+import argparse
+import sqlite3
+import sys
+import time
+
+LOW_STOCK_THRESHOLD = 10
+SUMMARY_COLUMNS = ("category", "supplier")
+BACKFILL_CHUNK = 5000
+
+# Schema changes for inventory.db, applied in order. PRAGMA user_version records the last one applied;
+# each migration and its version bump commit together, so a failed upgrade leaves the previous schema.
+# Row backfills are not part of that transaction: they run afterwards in short chunks whose progress is
+# saved in schema_backfills, so a large table upgrades without holding the write lock for minutes and an
+# interrupted backfill picks up where it stopped.
+
+def summary_change(column, row, sign):
+    # Adds (sign "+") or removes (sign "-") one item row's contribution to a summary table
+    return f"""INSERT INTO {column}_summary ({column}, item_count, total_quantity, total_value, low_stock_count)
+               VALUES (IFNULL({row}.{column}, ''), {sign}1, {sign}{row}.quantity, {sign}{row}.quantity * {row}.price,
+                       {sign}({row}.quantity <= {LOW_STOCK_THRESHOLD}))
+               ON CONFLICT({column}) DO UPDATE SET item_count = item_count + excluded.item_count,
+                                                   total_quantity = total_quantity + excluded.total_quantity,
+                                                   total_value = total_value + excluded.total_value,
+                                                   low_stock_count = low_stock_count + excluded.low_stock_count;"""
+
+def summary_cleanup(column):
+    return f"DELETE FROM {column}_summary WHERE {column} = IFNULL(old.{column}, '') AND item_count = 0;"
+
+def create_schema(conn):
+    # Everything init_schema used to create; IF NOT EXISTS throughout because older files have some of it
+    conn.execute('''CREATE TABLE IF NOT EXISTS items
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  name TEXT NOT NULL,
+                  quantity INTEGER NOT NULL,
+                  price REAL NOT NULL,
+                  category TEXT,
+                  description TEXT,
+                  supplier TEXT)''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_items_name ON items(name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_items_category ON items(category)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_items_supplier ON items(supplier)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_items_price ON items(price)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_items_quantity ON items(quantity)")
+
+    has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'items_fts'").fetchone()
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(name, description, content='items', content_rowid='id')")
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+                      INSERT INTO items_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+                    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+                      INSERT INTO items_fts(items_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+                    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE OF name, description ON items BEGIN
+                      INSERT INTO items_fts(items_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+                      INSERT INTO items_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+                    END''')
+    if not has_fts:
+        conn.execute("INSERT INTO items_fts(items_fts) VALUES ('rebuild')")
+
+    # Per-category and per-supplier totals kept current by triggers, so the dashboard never scans items
+    has_summaries = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'category_summary'").fetchone()
+    for column in SUMMARY_COLUMNS:
+        conn.execute(f'''CREATE TABLE IF NOT EXISTS {column}_summary
+                         ({column} TEXT PRIMARY KEY,
+                          item_count INTEGER NOT NULL,
+                          total_quantity INTEGER NOT NULL,
+                          total_value REAL NOT NULL,
+                          low_stock_count INTEGER NOT NULL)''')
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {column}_summary_insert AFTER INSERT ON items BEGIN
+                           {summary_change(column, "new", "+")}
+                         END""")
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {column}_summary_delete AFTER DELETE ON items BEGIN
+                           {summary_change(column, "old", "-")}
+                           {summary_cleanup(column)}
+                         END""")
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {column}_summary_update AFTER UPDATE OF quantity, price, {column} ON items BEGIN
+                           {summary_change(column, "old", "-")}
+                           {summary_cleanup(column)}
+                           {summary_change(column, "new", "+")}
+                         END""")
+        if not has_summaries:
+            conn.execute(f"INSERT INTO {column}_summary ({column}, item_count, total_quantity, total_value, low_stock_count) "
+                         f"SELECT IFNULL({column}, ''), COUNT(*), SUM(quantity), SUM(quantity * price), SUM(quantity <= ?) "
+                         f"FROM items GROUP BY IFNULL({column}, '')", (LOW_STOCK_THRESHOLD,))
+
+def add_item_columns(conn):
+    conn.execute("ALTER TABLE items ADD COLUMN sku TEXT")
+    conn.execute("ALTER TABLE items ADD COLUMN reorder_level INTEGER")
+    conn.execute("ALTER TABLE items ADD COLUMN updated_at REAL")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_items_sku ON items(sku)")
+
+def backfill_updated_at(conn, after, limit):
+    # Rows written before the column existed are stamped with the time of the upgrade
+    row = conn.execute("SELECT MAX(id), COUNT(*) FROM (SELECT id FROM items WHERE id > ? ORDER BY id LIMIT ?)", (after, limit)).fetchone()
+    if not row[1]:
+        return None, 0
+    conn.execute("UPDATE items SET updated_at = ? WHERE id > ? AND id <= ? AND updated_at IS NULL", (time.time(), after, row[0]))
+    return row[0], row[1]
+
+def add_item_changes(conn):
+    # Change log read by the alert engine, plus the state it keeps between runs
+    conn.execute("CREATE TABLE item_changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, item_id INTEGER NOT NULL, quantity INTEGER)")
+    conn.execute("CREATE TABLE low_stock (item_id INTEGER PRIMARY KEY)")
+    conn.execute("CREATE TABLE category_thresholds (category TEXT PRIMARY KEY, threshold INTEGER NOT NULL)")
+    conn.execute('''CREATE TRIGGER item_changes_insert AFTER INSERT ON items BEGIN
+                      INSERT INTO item_changes (item_id, quantity) VALUES (new.id, new.quantity);
+                    END''')
+    conn.execute('''CREATE TRIGGER item_changes_update AFTER UPDATE OF quantity, reorder_level, category ON items
+                    WHEN old.quantity IS NOT new.quantity OR old.reorder_level IS NOT new.reorder_level OR old.category IS NOT new.category
+                    BEGIN
+                      INSERT INTO item_changes (item_id, quantity) VALUES (new.id, new.quantity);
+                    END''')
+    conn.execute('''CREATE TRIGGER item_changes_delete AFTER DELETE ON items BEGIN
+                      INSERT INTO item_changes (item_id, quantity) VALUES (old.id, NULL);
+                    END''')
+
+def backfill_item_changes(conn, after, limit):
+    # Items that existed before the change log are logged once so their stock is checked
+    row = conn.execute("SELECT MAX(id), COUNT(*) FROM (SELECT id FROM items WHERE id > ? ORDER BY id LIMIT ?)", (after, limit)).fetchone()
+    if not row[1]:
+        return None, 0
+    conn.execute("INSERT INTO item_changes (item_id, quantity) SELECT id, quantity FROM items WHERE id > ? AND id <= ?", (after, row[0]))
+    return row[0], row[1]
+
+def index_nullable_columns(conn):
+    # Paging sorts and compares category and supplier as IFNULL(column, ''); index that expression
+    for column in ("category", "supplier"):
+        conn.execute(f"DROP INDEX IF EXISTS idx_items_{column}")
+        conn.execute(f"CREATE INDEX idx_items_{column}_key ON items(IFNULL({column}, ''))")
+
+def index_filter_sort(conn):
+    # A category or supplier filter sorted by price reads its first page straight off these
+    for column in ("category", "supplier"):
+        conn.execute(f"CREATE INDEX idx_items_{column}_price ON items(IFNULL({column}, ''), price)")
+
+# (version, description, schema change, chunked backfill or None)
+MIGRATIONS = [
+    (1, "items table, indexes, full-text search and summary tables", create_schema, None),
+    (2, "sku, reorder_level and updated_at columns on items", add_item_columns, backfill_updated_at),
+    (3, "item change log and low-stock alert state", add_item_changes, backfill_item_changes),
+    (4, "category and supplier indexes on IFNULL(column, '')", index_nullable_columns, None),
+    (5, "category and supplier indexes ordered by price", index_filter_sort, None),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+BACKFILLS = {version: backfill for version, _, _, backfill in MIGRATIONS if backfill}
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def pending_backfills(conn):
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'schema_backfills'").fetchone():
+        return []
+    return conn.execute("SELECT version, last_id FROM schema_backfills ORDER BY version").fetchall()
+
+def apply_migration(conn, version, upgrade, backfill):
+    # Returns False if another connection applied this version while we waited for the write lock
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if schema_version(conn) >= version:
+            conn.rollback()
+            return False
+        upgrade(conn)
+        if backfill:
+            conn.execute("INSERT OR REPLACE INTO schema_backfills (version, last_id) VALUES (?, 0)", (version,))
+        conn.execute(f"PRAGMA user_version = {version}")
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    return True
+
+def backfill_chunk(conn, chunk_size=BACKFILL_CHUNK):
+    # Runs one chunk of the oldest unfinished backfill in its own short transaction. Returns the
+    # number of rows covered, or None once no backfill is left.
+    pending = pending_backfills(conn)
+    if not pending:
+        return None
+    version, last_id = pending[0]
+    with conn:
+        last_id, rows = BACKFILLS[version](conn, last_id, chunk_size)
+        if rows:
+            conn.execute("UPDATE schema_backfills SET last_id = ? WHERE version = ?", (last_id, version))
+        else:
+            conn.execute("DELETE FROM schema_backfills WHERE version = ?", (version,))
+    return rows
+
+def migrate(conn, dry_run=False, backfill=True, chunk_size=BACKFILL_CHUNK, report=None):
+    report = report or (lambda message: None)
+    current = schema_version(conn)
+    pending = [migration for migration in MIGRATIONS if migration[0] > current]
+
+    if dry_run:
+        report(f"Schema version {current}, latest {LATEST_VERSION}.")
+        has_items = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'items'").fetchone()
+        items = conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] if has_items else 0
+        for version, description, _, step in pending:
+            report(f"Would apply {version}: {description}" + (f" (backfill over {items} rows)" if step else ""))
+        for version, last_id in pending_backfills(conn):
+            remaining = conn.execute("SELECT COUNT(*) FROM items WHERE id > ?", (last_id,)).fetchone()[0]
+            report(f"Would resume backfill for {version}: {remaining} rows left")
+        return current
+
+    if pending:
+        conn.execute("CREATE TABLE IF NOT EXISTS schema_backfills (version INTEGER PRIMARY KEY, last_id INTEGER NOT NULL)")
+    for version, description, upgrade, step in pending:
+        started = time.perf_counter()
+        if apply_migration(conn, version, upgrade, step):
+            report(f"Applied {version}: {description} in {(time.perf_counter() - started) * 1000:.1f} ms")
+        else:
+            report(f"Skipped {version}: already applied by another connection")
+
+    if backfill:
+        started = time.perf_counter()
+        total = chunks = 0
+        while True:
+            rows = backfill_chunk(conn, chunk_size)
+            if rows is None:
+                break
+            total += rows
+            chunks += 1
+        if chunks:
+            elapsed = time.perf_counter() - started
+            report(f"Backfilled {total} rows in {chunks} chunks in {elapsed * 1000:.1f} ms ({total / max(elapsed, 1e-9):.0f} rows/s)")
+    return schema_version(conn)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Upgrade inventory.db to the latest schema.")
+    parser.add_argument("--db", default="inventory.db")
+    parser.add_argument("--dry-run", action="store_true", help="list what would run without changing the database")
+    parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK, help="rows per backfill transaction")
+    parser.add_argument("--no-backfill", action="store_true", help="apply schema changes only and leave backfills pending")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    conn.execute("PRAGMA journal_mode=WAL")
+    try:
+        started = time.perf_counter()
+        version = migrate(conn, args.dry_run, not args.no_backfill, args.chunk_size, report=print)
+        if not args.dry_run:
+            print(f"Schema version {version} in {(time.perf_counter() - started) * 1000:.1f} ms.")
+        return 0
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
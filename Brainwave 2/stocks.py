@@ -1,23 +1,31 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-import sqlite3
-
-def init_db():
-    conn = sqlite3.connect('inventory.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS items 
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                  name TEXT NOT NULL, 
-                  quantity INTEGER NOT NULL, 
-                  price REAL NOT NULL,
-                  category TEXT,
-                  description TEXT,
-                  supplier TEXT)''')
-    conn.commit()
-    conn.close()
+from tkinter import ttk, messagebox, filedialog
+import os
+import sys
+import time
+from inventory_db import InventoryDB, ItemQuery, validate_item, LOW_STOCK_THRESHOLD, SUMMARY_COLUMNS
+import bulk_io
+from alerts import AlertEngine
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from task_runner import TaskRunner
+from instrument import STARTED, timed, callback, interactive
+
+PAGE_SIZE = 100
+WINDOW_PAGES = 3
+SEARCH_DELAY_MS = 300
+BACKFILL_DELAY_MS = 50
+ALERT_POPUP_LIMIT = 5
+STARTUP_BUDGET_MS = 1000
+LOGIN_BUDGET_MS = 500
+
+FORM_FIELDS = ("Name:", "Quantity:", "Price:", "Category:", "Description:", "Supplier:")
+
+SORTABLE_HEADINGS = {"ID": "id", "Name": "name", "Quantity": "quantity", "Price": "price", "Category": "category", "Supplier": "supplier"}
 
 class InventoryApp:
     def __init__(self, root):
+        self.started = time.perf_counter()
         self.root = root
         self.root.title("Inventory Management System")
         self.root.configure(bg="black")
@@ -30,7 +38,9 @@ class InventoryApp:
         y = (screen_height // 2) - (window_height // 2)
         self.root.geometry(f"{window_width}x{window_height}+{x}+{y}")
 
-        init_db()
+        self.db = InventoryDB()
+        self.seen_version = None
+        self.alerts = AlertEngine(self.db)
 
         self.main_frame = ttk.Frame(self.root, padding="10", style="Main.TFrame")
         self.main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -61,65 +71,485 @@ class InventoryApp:
         self.tree.column("Description", width=200)
         self.tree.column("Supplier", width=100)
 
+        for heading, column in SORTABLE_HEADINGS.items():
+            self.tree.heading(heading, command=lambda column=column: self.sort_by(column))
+
         self.tree.grid(row=0, column=0, columnspan=4, pady=10)
 
+        self.scrollbar = ttk.Scrollbar(self.main_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.scrollbar.grid(row=0, column=4, sticky=(tk.N, tk.S), pady=10)
+        self.tree.configure(yscrollcommand=self.on_tree_scroll)
+
+        # Only a window of rows around the visible area is kept in the Treeview
+        self.window_ids = []
+        self.row_iids = {}
+        self.row_ids = {}
+        self.row_values = {}
+        self.first_serial = 1
+        self.at_end = False
+        self.paging = False
+        self.view_generation = 0
+        self.query = ItemQuery()
+
         # Button Style
         button_style = {"bg": "green", "fg": "white", "relief": "flat", "padx": 10, "pady": 5, "font": ("Arial", 10, "bold"), "width": 15, "height": 2}
 
         tk.Button(self.main_frame, text="Add Item", command=self.add_item_window, **button_style).grid(row=1, column=0, pady=5)
         tk.Button(self.main_frame, text="Edit Item", command=self.edit_item_window, **button_style).grid(row=1, column=1, pady=5)
         tk.Button(self.main_frame, text="Delete Item", command=self.delete_item, **button_style).grid(row=1, column=2, pady=5)
-        tk.Button(self.main_frame, text="Refresh", command=self.load_items, **button_style).grid(row=1, column=3, pady=5)
-
+        tk.Button(self.main_frame, text="Refresh", command=self.refresh_items, **button_style).grid(row=1, column=3, pady=5)
+        tk.Button(self.main_frame, text="Import", command=self.import_items, **button_style).grid(row=2, column=0, pady=5)
+        tk.Button(self.main_frame, text="Export", command=self.export_items, **button_style).grid(row=2, column=1, pady=5)
+        tk.Button(self.main_frame, text="Analytics", command=self.analytics_window, **button_style).grid(row=2, column=2, pady=5)
+
+        status_frame = ttk.Frame(self.main_frame, style="Main.TFrame")
+        status_frame.grid(row=2, column=3, pady=5)
+        self.status_label = ttk.Label(status_frame, text="", background="black", foreground="white")
+        self.status_label.grid(row=0, column=0)
+        self.busy_label = ttk.Label(status_frame, text="", background="black", foreground="#FFEB3B")
+        self.busy_label.grid(row=1, column=0)
+
+        # Search and filters run as indexed SQL on a background thread, debounced while typing
+        self.filter_frame = ttk.Frame(self.main_frame, style="Main.TFrame")
+        self.filter_frame.grid(row=3, column=0, columnspan=4, pady=5)
+        self.search_var = tk.StringVar()
+        self.category_var = tk.StringVar()
+        self.supplier_var = tk.StringVar()
+        self.min_price_var = tk.StringVar()
+        self.max_price_var = tk.StringVar()
+        filters = (("Search:", self.search_var, 20), ("Category:", self.category_var, 12), ("Supplier:", self.supplier_var, 12),
+                   ("Min Price:", self.min_price_var, 8), ("Max Price:", self.max_price_var, 8))
+        for column, (text, variable, width) in enumerate(filters):
+            ttk.Label(self.filter_frame, text=text, background="black", foreground="white").grid(row=0, column=column * 2, padx=2)
+            ttk.Entry(self.filter_frame, textvariable=variable, width=width).grid(row=0, column=column * 2 + 1, padx=2)
+            variable.trace_add("write", self.schedule_search)
+
+        self.search_job = None
+        self.new_window = None
+        self.edit_window = None
+        self.edit_item_id = None
+
+        # Created once the status labels exist, since the first submit reports busy through them.
+        # Schema setup runs on the worker ahead of the first page, so the window appears straight away;
+        # row backfills left by a migration run later in small chunks between the user's own work
+        self.runner = TaskRunner(self.root, on_busy=self.show_busy, on_error=self.show_error)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        self.runner.submit(lambda: self.db.init_schema(backfill=False))
         self.load_items()
 
-    def load_items(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        conn = sqlite3.connect('inventory.db')
-        c = conn.cursor()
-        c.execute("SELECT * FROM items")
-        rows = c.fetchall()
-        
-        # Add serial number as the first column value
-        for index, row in enumerate(rows, start=1):  # Start counting from 1
-            self.tree.insert("", tk.END, values=(index, *row))  # Add serial number before other columns
-        
-        conn.close()
+    def load_items(self, query=None):
+        # Repeated reloads while one is still queued collapse into a single scan for the newest query
+        query = query or self.query
+        self.runner.submit(lambda: (self.db.data_version(), self.db.fetch_page(query, limit=PAGE_SIZE)),
+                           on_done=lambda result: self.show_first_page(query, *result), key="load")
+
+    @timed("tree.show_first_page")
+    def show_first_page(self, query, version, rows):
+        self.tree.delete(*self.tree.get_children())
+        self.query = query
+        self.view_generation += 1
+        self.window_ids = []
+        self.row_iids = {}
+        self.row_ids = {}
+        self.row_values = {}
+        self.first_serial = 1
+        self.at_end = False
+        self.seen_version = version
+        self.append_rows(rows)
+        self.tree.yview_moveto(0)
+        if self.started is not None:
+            interactive("startup.stocks", self.started, STARTUP_BUDGET_MS)
+            self.started = None
+            self.root.after(BACKFILL_DELAY_MS, self.backfill)
+        # The first screen is up; the next page streams in behind it so scrolling does not wait
+        self.root.after_idle(self.prefetch)
+
+    def backfill(self):
+        self.runner.submit(self.db.backfill_chunk, on_done=self.backfilled, key="backfill")
+
+    def backfilled(self, rows):
+        if rows is not None:
+            self.root.after(BACKFILL_DELAY_MS, self.backfill)
+        else:
+            self.check_alerts()
 
-    def add_item_window(self):
-        self.new_window = tk.Toplevel(self.root)
-        self.new_window.title("Add Item")
-        self.new_window.geometry("400x300")
-        self.new_window.configure(bg="black")
+    def check_alerts(self):
+        # Evaluates only the items changed since the last check, a batch at a time between user actions
+        self.runner.submit(self.alerts.process_batch, on_done=self.alerts_checked, key="alerts")
+
+    def alerts_checked(self, result):
+        alerts, more = result
+        if more:
+            self.root.after(BACKFILL_DELAY_MS, self.check_alerts)
+        if not alerts:
+            return
+        self.set_status(f"{len(alerts)} item(s) low on stock")
+        if len(alerts) <= ALERT_POPUP_LIMIT:
+            messagebox.showwarning("Low Stock", "\n".join(f"{alert.name}: {alert.quantity} left (reorder at {alert.threshold})" for alert in alerts))
 
-        ttk.Label(self.new_window, text="Name:", background="black", foreground="white").grid(row=0, column=0, padx=5, pady=5)
-        self.name_entry = ttk.Entry(self.new_window)
-        self.name_entry.grid(row=0, column=1, padx=5, pady=5)
+    def prefetch(self):
+        if self.paging or self.at_end or not self.window_ids or len(self.window_ids) >= PAGE_SIZE * (WINDOW_PAGES - 1):
+            return
+        self.page_in(after=self.row_values[self.window_ids[-1]])
+
+    @timed("tree.append_rows")
+    def append_rows(self, rows):
+        if len(rows) < PAGE_SIZE:
+            self.at_end = True
+        if not rows:
+            return
 
-        ttk.Label(self.new_window, text="Quantity:", background="black", foreground="white").grid(row=1, column=0, padx=5, pady=5)
-        self.quantity_entry = ttk.Entry(self.new_window)
-        self.quantity_entry.grid(row=1, column=1, padx=5, pady=5)
+        serial = self.first_serial + len(self.window_ids)
+        for index, row in enumerate(rows, start=serial):
+            self.insert_row(row[0], tk.END, (index, *row))
+            self.row_values[row[0]] = row
+            self.window_ids.append(row[0])
+
+        overflow = len(self.window_ids) - PAGE_SIZE * WINDOW_PAGES
+        if overflow > 0:
+            self.drop_rows(self.window_ids[:overflow])
+            del self.window_ids[:overflow]
+            self.first_serial += overflow
+            self.tree.yview_scroll(-overflow, "units")
+
+    @timed("tree.prepend_rows")
+    def prepend_rows(self, rows):
+        if not rows:
+            self.first_serial = 1
+            return
+
+        self.first_serial -= len(rows)
+        for index, row in enumerate(rows):
+            self.insert_row(row[0], index, (self.first_serial + index, *row))
+            self.row_values[row[0]] = row
+        self.window_ids[:0] = [row[0] for row in rows]
+        self.tree.yview_scroll(len(rows), "units")
+
+        overflow = len(self.window_ids) - PAGE_SIZE * WINDOW_PAGES
+        if overflow > 0:
+            self.drop_rows(self.window_ids[-overflow:])
+            del self.window_ids[-overflow:]
+            self.at_end = False
+
+    def insert_row(self, item_id, index, values):
+        iid = self.tree.insert("", index, values=values)
+        self.row_iids[item_id] = iid
+        self.row_ids[iid] = item_id
+
+    def drop_rows(self, item_ids):
+        iids = [self.row_iids.pop(item_id) for item_id in item_ids]
+        for item_id, iid in zip(item_ids, iids):
+            del self.row_values[item_id]
+            del self.row_ids[iid]
+        self.tree.delete(*iids)
+
+    @callback("stocks.refresh_items")
+    def refresh_items(self):
+        self.reload_window(only_if_changed=True)
+
+    def reload_window(self, only_if_changed=False):
+        if not self.window_ids:
+            self.load_items()
+            return
 
-        ttk.Label(self.new_window, text="Price:", background="black", foreground="white").grid(row=2, column=0, padx=5, pady=5)
-        self.price_entry = ttk.Entry(self.new_window)
-        self.price_entry.grid(row=2, column=1, padx=5, pady=5)
+        query, generation, seen = self.query, self.view_generation, self.seen_version
+        first = self.row_values[self.window_ids[0]]
+        last = None if self.at_end else self.row_values[self.window_ids[-1]]
+
+        def read_window():
+            # Nothing committed by another connection since the last check means nothing to patch
+            version = self.db.data_version()
+            if only_if_changed and version == seen:
+                return version, None
+            return version, self.db.fetch_range(query, first, last, limit=PAGE_SIZE * WINDOW_PAGES)
+
+        self.runner.submit(read_window, on_done=lambda result: self.patch_window(generation, first, last, *result),
+                           key="refresh" if only_if_changed else "reload")
+
+    @timed("tree.patch_window")
+    def patch_window(self, generation, first, last, version, rows):
+        if generation != self.view_generation or not self.window_ids or self.window_ids[0] != first.id:
+            return
+        self.seen_version = version
+        if rows is None:
+            return
+
+        # Re-read only the rows covered by the window and patch what changed
+        if last is None:
+            self.at_end = len(rows) < PAGE_SIZE * WINDOW_PAGES
+
+        fresh_ids = {row[0] for row in rows}
+        removed = [item_id for item_id in self.window_ids if item_id not in fresh_ids]
+        if removed:
+            self.drop_rows(removed)
+
+        # An edit to the sort column can reorder the rows that stay; move those first, then insert new ones
+        order = [item_id for item_id in self.window_ids if item_id in fresh_ids]
+        for position, item_id in enumerate([row[0] for row in rows if row[0] in self.row_iids]):
+            if order[position] != item_id:
+                self.tree.move(self.row_iids[item_id], "", position)
+                order.remove(item_id)
+                order.insert(position, item_id)
+
+        old_positions = {item_id: position for position, item_id in enumerate(self.window_ids) if item_id in fresh_ids}
+        for position, row in enumerate(rows):
+            item_id = row[0]
+            values = (self.first_serial + position, *row)
+            if item_id not in self.row_iids:
+                self.insert_row(item_id, position, values)
+            elif row != self.row_values[item_id] or old_positions[item_id] != position:
+                self.tree.item(self.row_iids[item_id], values=values)
+            self.row_values[item_id] = row
+        self.window_ids = [row[0] for row in rows]
+
+    def show_row(self, row):
+        if not self.query.is_default():
+            # The row may have moved within, into or out of a filtered or sorted view
+            self.reload_window()
+            return
+
+        item_id = row[0]
+        if item_id in self.row_iids:
+            position = self.window_ids.index(item_id)
+            self.tree.item(self.row_iids[item_id], values=(self.first_serial + position, *row))
+            self.row_values[item_id] = row
+        elif self.at_end and (not self.window_ids or item_id > self.window_ids[-1]):
+            serial = self.first_serial + len(self.window_ids)
+            self.insert_row(item_id, tk.END, (serial, *row))
+            self.row_values[item_id] = row
+            self.window_ids.append(item_id)
+
+    def remove_row(self, item_id):
+        if item_id not in self.row_iids:
+            return
+        position = self.window_ids.index(item_id)
+        self.drop_rows([item_id])
+        del self.window_ids[position]
+        for serial, later_id in enumerate(self.window_ids[position:], start=self.first_serial + position):
+            self.tree.item(self.row_iids[later_id], values=(serial, *self.row_values[later_id]))
+
+    def on_tree_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self.paging or not self.window_ids:
+            return
+        if float(last) > 0.9 and not self.at_end:
+            self.page_in(after=self.row_values[self.window_ids[-1]])
+        elif float(first) < 0.1 and self.first_serial > 1:
+            self.page_in(before=self.row_values[self.window_ids[0]])
+
+    def page_in(self, after=None, before=None):
+        self.paging = True
+        query, generation = self.query, self.view_generation
+
+        def paged(rows):
+            self.paging = False
+            if generation != self.view_generation or not self.window_ids:
+                return
+            if after is not None and self.window_ids[-1] == after.id:
+                self.append_rows(rows)
+            elif before is not None and self.window_ids[0] == before.id:
+                self.prepend_rows(rows)
+
+        def failed(error):
+            self.paging = False
+            self.show_error(error)
+
+        self.runner.submit(lambda: self.db.fetch_page(query, after=after, before=before, limit=PAGE_SIZE),
+                           on_done=paged, on_error=failed)
+
+    def schedule_search(self, *args):
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(SEARCH_DELAY_MS, self.start_search)
+
+    def parse_price(self, text):
+        try:
+            return float(text) if text.strip() else None
+        except ValueError:
+            return None
+
+    def start_search(self, sort=None, descending=None):
+        self.search_job = None
+        query = ItemQuery(self.search_var.get(), self.category_var.get().strip(), self.supplier_var.get().strip(),
+                          self.parse_price(self.min_price_var.get()), self.parse_price(self.max_price_var.get()),
+                          sort or self.query.sort, self.query.descending if descending is None else descending)
+        self.load_items(query)
+
+    @callback("stocks.sort_by")
+    def sort_by(self, column):
+        descending = not self.query.descending if column == self.query.sort else False
+        for heading, heading_column in SORTABLE_HEADINGS.items():
+            arrow = (" \u25bc" if descending else " \u25b2") if heading_column == column else ""
+            self.tree.heading(heading, text=heading + arrow)
+        self.start_search(column, descending)
+
+    def show_busy(self, busy):
+        self.busy_label.config(text="Working..." if busy else "")
+        self.root.config(cursor="watch" if busy else "")
+
+    def show_error(self, error):
+        messagebox.showerror("Error", str(error))
+
+    def close(self):
+        self.runner.close()
+        self.db.close()
+        self.root.destroy()
+
+    def set_status(self, text):
+        self.status_label.config(text=text)
+
+    @callback("stocks.import_items")
+    def import_items(self):
+        path = filedialog.askopenfilename(title="Import Items", filetypes=[("Inventory files", "*.csv *.jsonl *.json"), ("All files", "*.*")])
+        if not path:
+            return
 
-        ttk.Label(self.new_window, text="Category:", background="black", foreground="white").grid(row=3, column=0, padx=5, pady=5)
-        self.category_entry = ttk.Entry(self.new_window)
-        self.category_entry.grid(row=3, column=1, padx=5, pady=5)
+        upsert = messagebox.askyesno("Import", "Update existing items with the same name instead of adding duplicates?")
+        progress = lambda done, bad: self.runner.post(self.set_status, f"Imported {done}, rejected {bad}...")
+        self.runner.submit(lambda: bulk_io.import_items(self.db, path, upsert=upsert, progress=progress),
+                           on_done=self.import_finished, on_error=lambda e: self.transfer_failed("Import", e))
 
-        ttk.Label(self.new_window, text="Description:", background="black", foreground="white").grid(row=4, column=0, padx=5, pady=5)
-        self.description_entry = ttk.Entry(self.new_window)
-        self.description_entry.grid(row=4, column=1, padx=5, pady=5)
+    def import_finished(self, counts):
+        self.set_status("")
+        self.load_items()
+        messagebox.showinfo("Success", f"Imported {counts[0]} items, rejected {counts[1]}.")
+        self.check_alerts()
+
+    @callback("stocks.export_items")
+    def export_items(self):
+        path = filedialog.asksaveasfilename(title="Export Items", defaultextension=".csv",
+                                            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"), ("Legacy JSON", "*.json")])
+        if not path:
+            return
 
-        ttk.Label(self.new_window, text="Supplier:", background="black", foreground="white").grid(row=5, column=0, padx=5, pady=5)
-        self.supplier_entry = ttk.Entry(self.new_window)
-        self.supplier_entry.grid(row=5, column=1, padx=5, pady=5)
+        progress = lambda done: self.runner.post(self.set_status, f"Exported {done}...")
+        self.runner.submit(lambda: bulk_io.export_items(self.db, path, progress=progress),
+                           on_done=self.export_finished, on_error=lambda e: self.transfer_failed("Export", e))
+
+    def export_finished(self, exported):
+        self.set_status("")
+        messagebox.showinfo("Success", f"Exported {exported} items.")
+
+    def transfer_failed(self, action, error):
+        self.set_status("")
+        messagebox.showerror("Error", f"{action} failed: {error}")
+
+    @callback("stocks.analytics_window")
+    def analytics_window(self):
+        self.analytics = tk.Toplevel(self.root)
+        self.analytics.title("Analytics")
+        self.analytics.geometry("600x520")
+        self.analytics.configure(bg="black")
+
+        self.totals_label = ttk.Label(self.analytics, text="Loading...", background="black", foreground="white", font=("Arial", 10, "bold"))
+        self.totals_label.grid(row=0, column=0, padx=5, pady=5)
+
+        # The summaries are maintained by triggers, so this reads one row per category and supplier
+        self.summary_trees = {}
+        for row, column in enumerate(SUMMARY_COLUMNS, start=1):
+            tree = ttk.Treeview(self.analytics, columns=(column, "Items", "Quantity", "Value", "Low Stock"), show="headings", height=8, style="Treeview")
+            for heading, width in ((column, 150), ("Items", 80), ("Quantity", 100), ("Value", 120), ("Low Stock", 80)):
+                # The summaries count against the fixed threshold, not per-item reorder levels, so say so
+                tree.heading(heading, text=f"Qty <= {LOW_STOCK_THRESHOLD}" if heading == "Low Stock" else heading.title())
+                tree.column(heading, width=width)
+            tree.grid(row=row, column=0, padx=5, pady=5)
+            self.summary_trees[column] = tree
+
+        buttons = ttk.Frame(self.analytics, style="Main.TFrame")
+        buttons.grid(row=3, column=0, pady=5)
+        tk.Button(buttons, text="Refresh", command=self.load_analytics, bg="green", fg="white", relief="flat", padx=10, pady=5, font=("Arial", 10, "bold"), width=15).grid(row=0, column=0, padx=5)
+        tk.Button(buttons, text="Rebuild", command=self.rebuild_analytics, bg="green", fg="white", relief="flat", padx=10, pady=5, font=("Arial", 10, "bold"), width=15).grid(row=0, column=1, padx=5)
+        tk.Button(buttons, text="Reorder", command=self.reorder_window, bg="green", fg="white", relief="flat", padx=10, pady=5, font=("Arial", 10, "bold"), width=15).grid(row=0, column=2, padx=5)
+
+        self.load_analytics()
+
+    def load_analytics(self):
+        self.runner.submit(lambda: (self.db.summary_totals(), {column: self.db.summary(column) for column in SUMMARY_COLUMNS}),
+                           on_done=lambda result: self.show_analytics(*result), key="analytics")
+
+    def show_analytics(self, totals, summaries):
+        if not self.analytics.winfo_exists():
+            return
+        count, quantity, value, low_stock = totals
+        self.totals_label.config(text=f"Items: {count}   Quantity: {quantity}   Stock value: {value:,.2f}   "
+                                      f"Quantity <= {LOW_STOCK_THRESHOLD}: {low_stock}")
+        for column, rows in summaries.items():
+            tree = self.summary_trees[column]
+            tree.delete(*tree.get_children())
+            for key, items, total_quantity, total_value, low in rows:
+                tree.insert("", tk.END, values=(key or "(none)", items, total_quantity, f"{total_value:,.2f}", low))
+
+    @callback("stocks.rebuild_analytics")
+    def rebuild_analytics(self):
+        self.runner.submit(self.db.rebuild_summaries, on_done=self.analytics_rebuilt)
+
+    def analytics_rebuilt(self, mismatches):
+        if mismatches:
+            messagebox.showwarning("Rebuild", f"Summaries rebuilt; {len(mismatches)} inconsistent row(s) corrected.")
+        else:
+            messagebox.showinfo("Rebuild", "Summaries rebuilt; they were consistent.")
+        self.load_analytics()
+
+    def build_form(self, title, button_text, command):
+        # Each dialog is built once, then hidden and shown again instead of being recreated
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        window.geometry("400x300")
+        window.configure(bg="black")
+        window.protocol("WM_DELETE_WINDOW", window.withdraw)
+
+        entries = []
+        for row, text in enumerate(FORM_FIELDS):
+            ttk.Label(window, text=text, background="black", foreground="white").grid(row=row, column=0, padx=5, pady=5)
+            entry = ttk.Entry(window)
+            entry.grid(row=row, column=1, padx=5, pady=5)
+            entries.append(entry)
+
+        tk.Button(window, text=button_text, command=command, bg="green", fg="white", relief="flat", padx=10, pady=5, font=("Arial", 10, "bold"), width=15, height=2).grid(row=len(FORM_FIELDS), column=0, columnspan=2, pady=10)
+        return window, entries
+
+    def show_form(self, window, entries, values):
+        for entry, value in zip(entries, values):
+            entry.delete(0, tk.END)
+            entry.insert(0, value)
+        window.deiconify()
+        window.lift()
+        entries[0].focus_set()
+
+    @callback("stocks.reorder_window")
+    def reorder_window(self):
+        self.reorder = tk.Toplevel(self.root)
+        self.reorder.title("Reorder Suggestions")
+        self.reorder.geometry("600x400")
+        self.reorder.configure(bg="black")
+
+        # One node per supplier with the low-stock items to order from it underneath
+        self.reorder_tree = ttk.Treeview(self.reorder, columns=("Quantity", "Threshold", "Order"), show="tree headings", height=16, style="Treeview")
+        self.reorder_tree.heading("#0", text="Supplier / Item")
+        self.reorder_tree.column("#0", width=250)
+        for heading in ("Quantity", "Threshold", "Order"):
+            self.reorder_tree.heading(heading, text=heading)
+            self.reorder_tree.column(heading, width=100)
+        self.reorder_tree.grid(row=0, column=0, padx=5, pady=5)
+
+        self.runner.submit(self.alerts.suggestions, on_done=self.show_suggestions, key="suggestions")
+
+    def show_suggestions(self, grouped):
+        if not self.reorder.winfo_exists():
+            return
+        for supplier, items in grouped.items():
+            parent = self.reorder_tree.insert("", tk.END, text=supplier or "(none)", open=True, values=("", "", sum(item[4] for item in items)))
+            for item_id, name, quantity, threshold, order in items:
+                self.reorder_tree.insert(parent, tk.END, text=name, values=(quantity, threshold, order))
 
-        tk.Button(self.new_window, text="Add", command=self.add_item, bg="green", fg="white", relief="flat", padx=10, pady=5, font=("Arial", 10, "bold"), width=15, height=2).grid(row=6, column=0, columnspan=2, pady=10)
+    @callback("stocks.add_item_window")
+    def add_item_window(self):
+        if self.new_window is None:
+            self.new_window, self.add_entries = self.build_form("Add Item", "Add", self.add_item)
+            self.name_entry, self.quantity_entry, self.price_entry, self.category_entry, self.description_entry, self.supplier_entry = self.add_entries
+        self.show_form(self.new_window, self.add_entries, [""] * len(FORM_FIELDS))
 
+    @callback("stocks.add_item")
     def add_item(self):
         name = self.name_entry.get()
         quantity = self.quantity_entry.get()
@@ -128,74 +558,49 @@ class InventoryApp:
         description = self.description_entry.get()
         supplier = self.supplier_entry.get()
 
-        if not name or not quantity or not price or not category or not description or not supplier:
-            messagebox.showerror("Error", "All fields are required!")
-            return
-
         try:
-            quantity = int(quantity)
-            price = float(price)
-            if quantity < 0 or price < 0:
-                raise ValueError
-        except ValueError:
-            messagebox.showerror("Error", "Quantity must be a positive integer and Price a positive number!")
+            name, quantity, price, category, description, supplier = validate_item(name, quantity, price, category, description, supplier)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
             return
 
-        conn = sqlite3.connect('inventory.db')
-        c = conn.cursor()
-        c.execute("INSERT INTO items (name, quantity, price, category, description, supplier) VALUES (?, ?, ?, ?, ?, ?)", 
-                  (name, quantity, price, category, description, supplier))
-        conn.commit()
-        conn.close()
+        window = self.new_window
+        self.runner.submit(lambda: self.db.add_item(name, quantity, price, category, description, supplier),
+                           on_done=lambda row: self.item_saved(row, window, "Item added successfully!"))
 
-        self.load_items()
-        self.new_window.destroy()
-        messagebox.showinfo("Success", "Item added successfully!")
+    def item_saved(self, row, window, message):
+        self.show_row(row)
+        window.withdraw()
+        messagebox.showinfo("Success", message)
+        self.check_alerts()
 
+    @callback("stocks.edit_item_window")
     def edit_item_window(self):
         selected = self.tree.selection()
         if not selected:
             messagebox.showerror("Error", "Please select an item to edit!")
             return
 
-        item = self.tree.item(selected[0])["values"]
-        self.edit_window = tk.Toplevel(self.root)
-        self.edit_window.title("Edit Item")
-        self.edit_window.geometry("400x300")
-        self.edit_window.configure(bg="black")
-
-        ttk.Label(self.edit_window, text="Name:", background="black", foreground="white").grid(row=0, column=0, padx=5, pady=5)
-        self.edit_name_entry = ttk.Entry(self.edit_window)
-        self.edit_name_entry.insert(0, item[1])
-        self.edit_name_entry.grid(row=0, column=1, padx=5, pady=5)
-
-        ttk.Label(self.edit_window, text="Quantity:", background="black", foreground="white").grid(row=1, column=0, padx=5, pady=5)
-        self.edit_quantity_entry = ttk.Entry(self.edit_window)
-        self.edit_quantity_entry.insert(0, item[2])
-        self.edit_quantity_entry.grid(row=1, column=1, padx=5, pady=5)
-
-        ttk.Label(self.edit_window, text="Price:", background="black", foreground="white").grid(row=2, column=0, padx=5, pady=5)
-        self.edit_price_entry = ttk.Entry(self.edit_window)
-        self.edit_price_entry.insert(0, item[3])
-        self.edit_price_entry.grid(row=2, column=1, padx=5, pady=5)
-
-        ttk.Label(self.edit_window, text="Category:", background="black", foreground="white").grid(row=3, column=0, padx=5, pady=5)
-        self.edit_category_entry = ttk.Entry(self.edit_window)
-        self.edit_category_entry.insert(0, item[4])
-        self.edit_category_entry.grid(row=3, column=1, padx=5, pady=5)
-
-        ttk.Label(self.edit_window, text="Description:", background="black", foreground="white").grid(row=4, column=0, padx=5, pady=5)
-        self.edit_description_entry = ttk.Entry(self.edit_window)
-        self.edit_description_entry.insert(0, item[5])
-        self.edit_description_entry.grid(row=4, column=1, padx=5, pady=5)
-
-        ttk.Label(self.edit_window, text="Supplier:", background="black", foreground="white").grid(row=5, column=0, padx=5, pady=5)
-        self.edit_supplier_entry = ttk.Entry(self.edit_window)
-        self.edit_supplier_entry.insert(0, item[6])
-        self.edit_supplier_entry.grid(row=5, column=1, padx=5, pady=5)
-
-        tk.Button(self.edit_window, text="Update", command=lambda: self.update_item(item[0]), bg="green", fg="white", relief="flat", padx=10, pady=5, font=("Arial", 10, "bold"), width=15, height=2).grid(row=6, column=0, columnspan=2, pady=10)
+        # Typed values from the item cache; Treeview values come back from Tcl as strings
+        item_id = self.row_ids.get(selected[0])
+        record = self.db.cache.get(item_id) if item_id is not None else None
+        if record is None:
+            self.runner.submit(lambda: self.db.get_item(item_id), on_done=self.show_edit_form)
+            return
+        self.show_edit_form(record.as_tuple())
 
+    def show_edit_form(self, item):
+        if item is None:
+            messagebox.showerror("Error", "The selected item no longer exists!")
+            return
+        if self.edit_window is None:
+            self.edit_window, self.edit_entries = self.build_form("Edit Item", "Update", lambda: self.update_item(self.edit_item_id))
+            (self.edit_name_entry, self.edit_quantity_entry, self.edit_price_entry, self.edit_category_entry,
+             self.edit_description_entry, self.edit_supplier_entry) = self.edit_entries
+        self.edit_item_id = item[0]
+        self.show_form(self.edit_window, self.edit_entries, item[1:])
+
+    @callback("stocks.update_item")
     def update_item(self, item_id):
         name = self.edit_name_entry.get()
         quantity = self.edit_quantity_entry.get()
@@ -204,30 +609,17 @@ class InventoryApp:
         description = self.edit_description_entry.get()
         supplier = self.edit_supplier_entry.get()
 
-        if not name or not quantity or not price or not category or not description or not supplier:
-            messagebox.showerror("Error", "All fields are required!")
-            return
-
         try:
-            quantity = int(quantity)
-            price = float(price)
-            if quantity < 0 or price < 0:
-                raise ValueError
-        except ValueError:
-            messagebox.showerror("Error", "Quantity must be a positive integer and Price a positive number!")
+            name, quantity, price, category, description, supplier = validate_item(name, quantity, price, category, description, supplier)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
             return
 
-        conn = sqlite3.connect('inventory.db')
-        c = conn.cursor()
-        c.execute("UPDATE items SET name=?, quantity=?, price=?, category=?, description=?, supplier=? WHERE id=?", 
-                  (name, quantity, price, category, description, supplier, item_id))
-        conn.commit()
-        conn.close()
-
-        self.load_items()
-        self.edit_window.destroy()
-        messagebox.showinfo("Success", "Item updated successfully!")
+        window = self.edit_window
+        self.runner.submit(lambda: self.db.update_item(item_id, name, quantity, price, category, description, supplier),
+                           on_done=lambda row: self.item_saved(row, window, "Item updated successfully!"))
 
+    @callback("stocks.delete_item")
     def delete_item(self):
         selected = self.tree.selection()
         if not selected:
@@ -235,14 +627,13 @@ class InventoryApp:
             return
 
         if messagebox.askyesno("Confirm", "Are you sure you want to delete this item?"):
-            item_id = self.tree.item(selected[0])["values"][1]  # Get ID instead of serial number
-            conn = sqlite3.connect('inventory.db')
-            c = conn.cursor()
-            c.execute("DELETE FROM items WHERE id=?", (item_id,))
-            conn.commit()
-            conn.close()
-            self.load_items()
-            messagebox.showinfo("Success", "Item deleted successfully!")
+            item_id = self.row_ids.get(selected[0])
+            self.runner.submit(lambda: self.db.delete_item(item_id), on_done=lambda result: self.item_deleted(item_id))
+
+    def item_deleted(self, item_id):
+        self.remove_row(item_id)
+        messagebox.showinfo("Success", "Item deleted successfully!")
+        self.check_alerts()
 
 class LoginWindow:
     def __init__(self, root):
@@ -251,25 +642,29 @@ class LoginWindow:
         self.root.geometry("300x200")
         self.root.configure(bg="black")
 
-        ttk.Label(self.root, text="Username:", background="black", foreground="white").grid(row=0, column=0, padx=5, pady=5)
-        self.username_entry = ttk.Entry(self.root)
+        # The login form lives in a frame on the one Tk root, which InventoryApp takes over after login
+        self.frame = tk.Frame(self.root, bg="black")
+        self.frame.grid(row=0, column=0)
+
+        ttk.Label(self.frame, text="Username:", background="black", foreground="white").grid(row=0, column=0, padx=5, pady=5)
+        self.username_entry = ttk.Entry(self.frame)
         self.username_entry.grid(row=0, column=1, padx=5, pady=5)
 
-        ttk.Label(self.root, text="Password:", background="black", foreground="white").grid(row=1, column=0, padx=5, pady=5)
-        self.password_entry = ttk.Entry(self.root, show="*")
+        ttk.Label(self.frame, text="Password:", background="black", foreground="white").grid(row=1, column=0, padx=5, pady=5)
+        self.password_entry = ttk.Entry(self.frame, show="*")
         self.password_entry.grid(row=1, column=1, padx=5, pady=5)
 
-        tk.Button(self.root, text="Login", command=self.login, bg="green", fg="white", relief="flat", padx=10, pady=5, font=("Arial", 10, "bold"), width=15, height=2).grid(row=2, column=0, columnspan=2, pady=10)
+        tk.Button(self.frame, text="Login", command=self.login, bg="green", fg="white", relief="flat", padx=10, pady=5, font=("Arial", 10, "bold"), width=15, height=2).grid(row=2, column=0, columnspan=2, pady=10)
+        self.root.after_idle(lambda: interactive("startup.login", STARTED, LOGIN_BUDGET_MS))
 
+    @callback("stocks.login")
     def login(self):
         username = self.username_entry.get()
         password = self.password_entry.get()
 
         if username == "admin" and password == "password":
-            self.root.destroy()
-            app_root = tk.Tk()
-            app = InventoryApp(app_root)
-            app_root.mainloop()
+            self.frame.destroy()
+            self.app = InventoryApp(self.root)
         else:
             messagebox.showerror("Error", "Invalid username or password!")
 
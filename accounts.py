@@ -0,0 +1,323 @@
+import argparse
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from instrument import timed
+from ledger import Ledger, InsufficientFunds, UnknownAccount, to_minor, from_minor
+from auth import Authenticator, LockedOut, is_hashed, ITERATIONS, VERIFY_CONCURRENCY
+
+DEFAULT_ACCOUNT = "1001"
+DEFAULT_PIN = "1234"
+DEFAULT_BALANCE = 1000.0
+MINIMUM_WITHDRAWAL = 500.0
+MAXIMUM_AMOUNT = 1e12
+
+class TransactionError(Exception):
+    pass
+
+class Account:
+    __slots__ = ("number", "pin", "lock")
+
+    def __init__(self, number, pin):
+        self.number = number
+        self.pin = pin
+        self.lock = threading.Lock()
+
+class AccountService:
+    # ATM rules without the GUI. Accounts live in an in-memory index with one lock each, so sessions
+    # on different accounts don't wait on each other; balances come from the shared ledger. PINs are
+    # kept as salted hashes and checked by the Authenticator.
+    def __init__(self, ledger=None, accounts_path="accounts.txt", minimum_withdrawal=MINIMUM_WITHDRAWAL, auth=None):
+        self.ledger = ledger or Ledger()
+        self.auth = auth or Authenticator()
+        self.accounts_path = accounts_path
+        self.minimum_withdrawal = minimum_withdrawal
+        self.accounts = {}
+        self.index_lock = threading.Lock()
+        if os.path.exists(self.accounts_path):
+            with open(self.accounts_path, "r") as file:
+                for line in file:
+                    number, pin = line.strip().split(",")
+                    self.accounts[number] = Account(number, pin)
+            self.hash_plaintext_pins()
+
+    def hash_plaintext_pins(self):
+        # accounts.txt from before PIN hashing holds plaintext PINs; hash them in parallel and save once
+        plaintext = [account for account in self.accounts.values() if not is_hashed(account.pin)]
+        if not plaintext:
+            return
+        with ThreadPoolExecutor(VERIFY_CONCURRENCY) as executor:
+            for account, hashed in zip(plaintext, executor.map(self.auth.hash_pin, [account.pin for account in plaintext])):
+                account.pin = hashed
+        with self.index_lock:
+            self.save_accounts()
+
+    @timed("file.save_accounts")
+    def save_accounts(self):
+        temp_path = self.accounts_path + ".tmp"
+        with open(temp_path, "w") as file:
+            for account in self.accounts.values():
+                file.write(f"{account.number},{account.pin}\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.accounts_path)
+
+    def open_account(self, number, pin, balance=DEFAULT_BALANCE, save=True):
+        if not self.validate_account_number(number):
+            raise TransactionError("Invalid account number. Please enter a valid account number.")
+        if not self.validate_pin(pin):
+            raise TransactionError("Invalid PIN. Please enter a 4-digit number.")
+        hashed = self.auth.hash_pin(pin)
+        with self.index_lock:
+            if number in self.accounts:
+                raise TransactionError(f"Account {number} already exists.")
+            # The ledger account exists before the index lists it, so no transfer can reach it half-opened
+            self.ledger.open_account(number, to_minor(balance))
+            self.accounts[number] = Account(number, hashed)
+            if save:
+                self.save_accounts()
+
+    def account(self, number):
+        account = self.accounts.get(number)
+        if account is None:
+            raise TransactionError("Invalid account number. Please enter a valid account number.")
+        return account
+
+    def validate_account_number(self, account_number):
+        return account_number.isdigit()
+
+    def validate_pin(self, pin):
+        return pin.isdigit() and len(pin) == 4
+
+    def check_amount(self, amount):
+        if not math.isfinite(amount) or amount <= 0:
+            raise TransactionError("Invalid amount. Please enter a positive number.")
+        if amount > MAXIMUM_AMOUNT:
+            raise TransactionError(f"Amount too large. The maximum is {MAXIMUM_AMOUNT:,.0f}.")
+        minor = to_minor(amount)
+        if minor <= 0:
+            raise TransactionError("Invalid amount. The smallest amount is 0.01.")
+        return minor
+
+    def authenticate(self, number, pin):
+        # Costs one KDF run unless the PIN was verified earlier in the session; call it off the Tk thread
+        account = self.accounts.get(number)
+        try:
+            ok = self.auth.verify(number, pin, account.pin if account else None)
+        except LockedOut as e:
+            raise TransactionError(f"Too many incorrect PINs. Please try again in {e.seconds:.0f} seconds.")
+        if ok and self.auth.needs_rehash(account.pin):
+            hashed = self.auth.hash_pin(pin)
+            with account.lock:
+                account.pin = hashed
+            with self.index_lock:
+                self.save_accounts()
+        return ok
+
+    def balance(self, number):
+        self.account(number)
+        return from_minor(self.ledger.balance(number))
+
+    def deposit(self, number, amount):
+        account = self.account(number)
+        amount = self.check_amount(amount)
+        with account.lock:
+            return from_minor(self.ledger.deposit(number, amount))
+
+    def withdraw(self, number, amount):
+        account = self.account(number)
+        if amount < self.minimum_withdrawal:
+            raise TransactionError(f"Minimum withdrawal amount is ₹{self.minimum_withdrawal:.2f}.")
+        amount = self.check_amount(amount)
+        with account.lock:
+            try:
+                return from_minor(self.ledger.withdraw(number, amount))
+            except InsufficientFunds:
+                raise TransactionError("Insufficient funds for withdrawal.")
+
+    def transfer(self, number, to_number, amount):
+        account = self.account(number)
+        to_account = self.account(to_number)
+        if account is to_account:
+            raise TransactionError("Cannot transfer to the same account.")
+        if amount < self.minimum_withdrawal:
+            raise TransactionError(f"Minimum transfer amount is ₹{self.minimum_withdrawal:.2f}.")
+        amount = self.check_amount(amount)
+        # Both locks are always taken in account-number order, so two opposite transfers can't deadlock
+        first, second = sorted((account, to_account), key=lambda a: a.number)
+        with first.lock, second.lock:
+            try:
+                return from_minor(self.ledger.transfer(number, to_number, amount))
+            except InsufficientFunds:
+                raise TransactionError("Insufficient funds for transfer.")
+            except UnknownAccount:
+                raise TransactionError("Invalid account number. Please enter a valid account number.")
+
+    def change_pin(self, number, current_pin, new_pin, save=True):
+        account = self.account(number)
+        if not self.authenticate(number, current_pin):
+            raise TransactionError("Incorrect current PIN. Please try again.")
+        if not self.validate_pin(new_pin):
+            raise TransactionError("Invalid PIN. Please enter a 4-digit number.")
+        hashed = self.auth.hash_pin(new_pin)
+        with account.lock:
+            account.pin = hashed
+        if save:
+            with self.index_lock:
+                self.save_accounts()
+
+    def reset(self, number):
+        account = self.account(number)
+        hashed = self.auth.hash_pin(DEFAULT_PIN)
+        with account.lock:
+            account.pin = hashed
+            balance = self.ledger.reset(number, to_minor(DEFAULT_BALANCE))
+        self.auth.forget(number)
+        with self.index_lock:
+            self.save_accounts()
+        return from_minor(balance)
+
+    def close(self):
+        self.ledger.close()
+        self.auth.close()
+
+def load_default_service(pin_file="pin.txt", balance_file="balance.txt"):
+    # First run after upgrading: pin.txt and balance.txt become account 1001
+    service = AccountService()
+    if DEFAULT_ACCOUNT not in service.accounts:
+        pin = DEFAULT_PIN
+        if os.path.exists(pin_file):
+            with open(pin_file, "r") as file:
+                pin = file.read().strip().zfill(4)
+        balance = DEFAULT_BALANCE
+        if service.ledger.has_account(DEFAULT_ACCOUNT):
+            balance = from_minor(service.ledger.balance(DEFAULT_ACCOUNT))
+        elif os.path.exists(balance_file):
+            with open(balance_file, "r") as file:
+                balance = float(file.read().strip())
+        hashed = service.auth.hash_pin(pin)
+        service.ledger.open_account(DEFAULT_ACCOUNT, to_minor(balance))
+        with service.index_lock:
+            service.accounts[DEFAULT_ACCOUNT] = Account(DEFAULT_ACCOUNT, hashed)
+            service.save_accounts()
+        # The hash is saved, so the plaintext PIN must not stay on disk
+        if os.path.exists(pin_file):
+            os.remove(pin_file)
+    return service
+
+def simulate(service, sessions, operations, seed=None):
+    # Drive the service from many threads at once, the way concurrent ATM sessions would
+    numbers = list(service.accounts)
+    counts = {"ok": 0, "rejected": 0}
+    counts_lock = threading.Lock()
+
+    def session(index):
+        rng = random.Random(None if seed is None else seed + index)
+        ok = rejected = 0
+        for _ in range(operations):
+            number = rng.choice(numbers)
+            action = rng.random()
+            try:
+                if action < 0.4:
+                    service.deposit(number, rng.randint(1, 5000))
+                elif action < 0.7:
+                    service.withdraw(number, rng.randint(500, 2000))
+                elif action < 0.9:
+                    service.transfer(number, rng.choice(numbers), rng.randint(500, 2000))
+                else:
+                    service.balance(number)
+                ok += 1
+            except TransactionError:
+                rejected += 1
+        with counts_lock:
+            counts["ok"] += ok
+            counts["rejected"] += rejected
+
+    threads = [threading.Thread(target=session, args=(index,)) for index in range(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counts["seconds"] = time.perf_counter() - started
+    return counts
+
+def simulate_logins(service, sessions, attempts, pin=DEFAULT_PIN, wrong=0.1, seed=None):
+    # A burst of concurrent logins, a fraction with the wrong PIN, timing each one
+    numbers = list(service.accounts)
+    latencies = []
+    counts = {"ok": 0, "failed": 0, "locked": 0}
+    counts_lock = threading.Lock()
+
+    def session(index):
+        rng = random.Random(None if seed is None else seed + index)
+        timings = []
+        local = {"ok": 0, "failed": 0, "locked": 0}
+        for _ in range(attempts):
+            number = rng.choice(numbers)
+            entered = pin if rng.random() >= wrong else "0000"
+            started = time.perf_counter()
+            try:
+                local["ok" if service.authenticate(number, entered) else "failed"] += 1
+            except TransactionError:
+                local["locked"] += 1
+            timings.append(time.perf_counter() - started)
+        with counts_lock:
+            latencies.extend(timings)
+            for key, value in local.items():
+                counts[key] += value
+
+    threads = [threading.Thread(target=session, args=(index,)) for index in range(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counts["seconds"] = time.perf_counter() - started
+    latencies.sort()
+    for name, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("max", 1.0)):
+        counts[name] = latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the ATM account service with simulated sessions.")
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--operations", type=int, default=200, help="operations per session")
+    parser.add_argument("--dir", help="where to keep the test ledger (defaults to a temporary directory)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--logins", type=int, default=0, help="login attempts per session to run as a burst after the operations")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS, help="PIN hashing cost for the test accounts")
+    args = parser.parse_args(argv)
+
+    directory = args.dir or tempfile.mkdtemp(prefix="atm-load-")
+    os.makedirs(directory, exist_ok=True)
+    ledger = Ledger(os.path.join(directory, "ledger.log"), os.path.join(directory, "ledger.snapshot"),
+                    os.path.join(directory, "ledger.lock"))
+    auth = Authenticator(os.path.join(directory, "auth.db"), iterations=args.iterations)
+    service = AccountService(ledger, os.path.join(directory, "accounts.txt"), auth=auth)
+    with ledger.batch():
+        for number in range(100000, 100000 + args.accounts):
+            if str(number) not in service.accounts:
+                service.open_account(str(number), DEFAULT_PIN, 10000.0, save=False)
+    service.save_accounts()
+
+    counts = simulate(service, args.sessions, args.operations, args.seed)
+    total = counts["ok"] + counts["rejected"]
+    print(f"{total} operations from {args.sessions} sessions in {counts['seconds']:.2f}s "
+          f"({total / counts['seconds']:.0f} ops/s), {counts['rejected']} rejected by the rules")
+    if args.logins:
+        logins = simulate_logins(service, args.sessions, args.logins, seed=args.seed)
+        print(f"{args.sessions * args.logins} logins in {logins['seconds']:.2f}s: {logins['ok']} ok, {logins['failed']} wrong PIN, "
+              f"{logins['locked']} locked out; latency p50 {logins['p50']:.1f} ms, p95 {logins['p95']:.1f} ms, "
+              f"p99 {logins['p99']:.1f} ms, max {logins['max']:.1f} ms")
+    print(f"Ledger: {directory}")
+    service.close()
+
+if __name__ == "__main__":
+    main()
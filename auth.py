@@ -0,0 +1,150 @@
+import hashlib
+import hmac
+import os
+import sqlite3
+import threading
+import time
+
+from instrument import timed, count
+
+# PBKDF2 cost for new and rehashed PINs; raise it as hardware gets faster. Stored hashes carry their
+# own iteration count, so existing PINs keep verifying and are rehashed at the new cost on next login.
+ITERATIONS = int(os.environ.get("BRAINWAVE_PIN_ITERATIONS", "100000"))
+VERIFY_CONCURRENCY = os.cpu_count() or 2
+FREE_ATTEMPTS = 3
+LOCKOUT_SECONDS = 30
+MAX_LOCKOUT_SECONDS = 3600
+SESSION_TTL = 300
+SESSION_CACHE_SIZE = 10000
+LOCK_STRIPES = 64
+SCHEME = "pbkdf2_sha256"
+
+class LockedOut(Exception):
+    def __init__(self, seconds):
+        super().__init__(f"Locked for {seconds:.0f} seconds")
+        self.seconds = seconds
+
+def hash_pin(pin, iterations=ITERATIONS):
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", pin.encode(), salt, iterations)
+    return f"{SCHEME}${iterations}${salt.hex()}${digest.hex()}"
+
+def is_hashed(stored):
+    return stored.startswith(SCHEME + "$")
+
+def check_pin(pin, stored):
+    _, iterations, salt, digest = stored.split("$")
+    candidate = hashlib.pbkdf2_hmac("sha256", pin.encode(), bytes.fromhex(salt), int(iterations))
+    return hmac.compare_digest(candidate, bytes.fromhex(digest))
+
+class Attempts:
+    __slots__ = ("failures", "locked_until")
+
+    def __init__(self, failures=0, locked_until=0.0):
+        self.failures = failures
+        self.locked_until = locked_until
+
+class Authenticator:
+    # PIN verification for AccountService. Failed attempts are counted per account in memory and
+    # written through to auth.db, so a restart does not clear a lockout. After FREE_ATTEMPTS failures
+    # each further one locks the account for twice as long as the last, up to MAX_LOCKOUT_SECONDS; a
+    # locked account is refused before any hashing. At most VERIFY_CONCURRENCY hashes run at once
+    # (hashlib releases the GIL), so a burst of logins queues instead of thrashing. Successful
+    # verifications are remembered for SESSION_TTL seconds so re-entering a PIN in the same session,
+    # for a PIN change say, skips the KDF.
+    def __init__(self, path="auth.db", iterations=ITERATIONS, concurrency=VERIFY_CONCURRENCY, session_ttl=SESSION_TTL):
+        self.iterations = iterations
+        self.session_ttl = session_ttl
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.session_key = os.urandom(32)
+        self.dummy = None
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS lockouts (account TEXT PRIMARY KEY, failures INTEGER NOT NULL, locked_until REAL NOT NULL)")
+        # Only accounts with recent failures are held, so this stays small however many accounts exist
+        self.attempts = {account: Attempts(failures, locked_until)
+                         for account, failures, locked_until in self.conn.execute("SELECT account, failures, locked_until FROM lockouts")}
+
+    def hash_pin(self, pin):
+        return hash_pin(pin, self.iterations)
+
+    def needs_rehash(self, stored):
+        return not is_hashed(stored) or int(stored.split("$")[1]) != self.iterations
+
+    def locked_for(self, account):
+        attempts = self.attempts.get(account)
+        if attempts is None:
+            return 0.0
+        return max(attempts.locked_until - time.time(), 0.0)
+
+    @timed("auth.verify")
+    def verify(self, account, pin, stored):
+        # stored is None for an unknown account; a dummy hash is checked so it takes as long as a real one
+        if stored is None:
+            if self.dummy is None:
+                self.dummy = self.hash_pin("0000")
+            self.check_hash(pin, self.dummy)
+            return False
+
+        session = (account, stored, hmac.new(self.session_key, pin.encode(), hashlib.sha256).digest())
+        with self.stripes[hash(account) % LOCK_STRIPES]:
+            seconds = self.locked_for(account)
+            if seconds:
+                count("auth.locked_out")
+                raise LockedOut(seconds)
+            if self.sessions.get(session, 0.0) > time.time():
+                count("auth.session_hit")
+                return True
+
+            ok = self.check_hash(pin, stored)
+            if ok:
+                self.succeeded(account)
+                self.remember(session)
+            else:
+                self.failed(account)
+            return ok
+
+    def check_hash(self, pin, stored):
+        with self.slots:
+            return check_pin(pin, stored)
+
+    def remember(self, session):
+        with self.lock:
+            if len(self.sessions) >= SESSION_CACHE_SIZE:
+                now = time.time()
+                self.sessions = {key: expires for key, expires in self.sessions.items() if expires > now}
+                if len(self.sessions) >= SESSION_CACHE_SIZE:
+                    self.sessions.clear()
+            self.sessions[session] = time.time() + self.session_ttl
+
+    def failed(self, account):
+        attempts = self.attempts.setdefault(account, Attempts())
+        attempts.failures += 1
+        if attempts.failures >= FREE_ATTEMPTS:
+            attempts.locked_until = time.time() + min(LOCKOUT_SECONDS * 2 ** (attempts.failures - FREE_ATTEMPTS), MAX_LOCKOUT_SECONDS)
+        count("auth.failed")
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO lockouts (account, failures, locked_until) VALUES (?, ?, ?)",
+                              (account, attempts.failures, attempts.locked_until))
+
+    def succeeded(self, account):
+        if self.attempts.pop(account, None) is not None:
+            with self.lock, self.conn:
+                self.conn.execute("DELETE FROM lockouts WHERE account = ?", (account,))
+
+    def forget(self, account):
+        # Drops the account's cached sessions and clears any lockout, e.g. after a reset
+        with self.lock:
+            self.sessions = {key: expires for key, expires in self.sessions.items() if key[0] != account}
+        with self.stripes[hash(account) % LOCK_STRIPES]:
+            self.succeeded(account)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
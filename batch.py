@@ -0,0 +1,115 @@
+import argparse
+import json
+import sys
+import time
+
+from accounts import TransactionError, load_default_service
+
+GROUP_SIZE = 1000
+
+def parse_amount(value):
+    if isinstance(value, bool):
+        raise TransactionError("Invalid amount. Please enter a positive number.")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise TransactionError("Invalid amount. Please enter a positive number.")
+
+def apply_request(service, request, trusted=False):
+    # Every request must carry the account's PIN unless the file comes from a trusted source
+    kind = request.get("type")
+    account = str(request.get("account", ""))
+    if kind != "change_pin":
+        if "pin" in request:
+            if not service.authenticate(account, str(request["pin"])):
+                raise TransactionError("Incorrect PIN. Please try again.")
+        elif not trusted:
+            raise TransactionError("A PIN is required.")
+
+    if kind == "deposit":
+        return service.deposit(account, parse_amount(request.get("amount")))
+    if kind == "withdraw":
+        return service.withdraw(account, parse_amount(request.get("amount")))
+    if kind == "transfer":
+        to_account = str(request.get("to_account", ""))
+        if not service.validate_account_number(to_account):
+            raise TransactionError("Invalid account number. Please enter a valid account number.")
+        return service.transfer(account, to_account, parse_amount(request.get("amount")))
+    if kind == "change_pin":
+        service.change_pin(account, str(request.get("pin", "")), str(request.get("new_pin", "")), save=False)
+        return service.balance(account)
+    raise TransactionError(f"Unknown request type: {kind}")
+
+def process(service, requests, results, group_size=GROUP_SIZE, trusted=False):
+    # Requests are applied in groups that share one ledger fsync. A group's results are written
+    # before its entries are synced, and anything that raises first - a request that fails in an
+    # unexpected way, or the result stream itself - rolls the group's entries back, so the ledger
+    # never keeps entries whose results were not written.
+    counts = {"ok": 0, "rejected": 0}
+    pending = []
+    pins_changed = False
+
+    def commit():
+        if pins_changed:
+            with service.index_lock:
+                service.save_accounts()
+        for result in pending:
+            results.write(json.dumps(result) + "\n")
+        results.flush()
+        pending.clear()
+
+    lines = iter(requests)
+    number = 0
+    while True:
+        with service.ledger.batch():
+            group = dict(counts)
+            for line in lines:
+                if not line.strip():
+                    continue
+                number += 1
+                request_id = number
+                try:
+                    request = json.loads(line)
+                    request_id = request.get("id", number)
+                    balance = apply_request(service, request, trusted)
+                    pins_changed = pins_changed or request["type"] == "change_pin"
+                    pending.append({"id": request_id, "status": "ok", "balance": balance})
+                    group["ok"] += 1
+                except (TransactionError, ValueError, AttributeError) as e:
+                    message = str(e) if isinstance(e, TransactionError) else f"Malformed request: {e}"
+                    pending.append({"id": request_id, "status": "rejected", "error": message})
+                    group["rejected"] += 1
+                if len(pending) >= group_size:
+                    break
+            if not pending:
+                return counts
+            commit()
+        counts = group
+        pins_changed = False
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply a JSONL file of ATM requests without the GUI.")
+    parser.add_argument("path", help="JSONL requests: deposit, withdraw, transfer or change_pin")
+    parser.add_argument("-o", "--results", default="-", help="where to write one JSON result per request (default stdout)")
+    parser.add_argument("--group-size", type=int, default=GROUP_SIZE, help="requests per group commit")
+    parser.add_argument("--trusted", action="store_true", help="apply requests that carry no PIN")
+    args = parser.parse_args(argv)
+
+    service = load_default_service()
+    results = sys.stdout if args.results == "-" else open(args.results, "w", encoding="utf-8")
+    started = time.perf_counter()
+    try:
+        with open(args.path, encoding="utf-8") as requests:
+            counts = process(service, requests, results, args.group_size, args.trusted)
+    finally:
+        if results is not sys.stdout:
+            results.close()
+        service.close()
+
+    seconds = time.perf_counter() - started
+    total = counts["ok"] + counts["rejected"]
+    print(f"Processed {total} requests ({counts['rejected']} rejected) in {seconds:.2f}s, "
+          f"{total / seconds if seconds else 0:.0f} requests/s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
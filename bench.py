@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+INVENTORY_DIR = os.path.join(ROOT, "Brainwave 2")
+sys.path.insert(0, INVENTORY_DIR)
+
+from inventory_db import InventoryDB, ItemQuery
+from ledger import Ledger
+from accounts import AccountService
+
+DEFAULT_SIZES = (1000, 100000, 1000000)
+DEFAULT_THRESHOLD = 0.2
+FILTER_BUDGET_MS = 50
+
+# First page of a filtered view; sample_rows names every item "Item <n>", so the text search matches all of them
+FILTER_QUERIES = {
+    "search_text": ItemQuery(text="Item"),
+    "search_text_words": ItemQuery(text="Item 12"),
+    "filter_category_price": ItemQuery(category="Category 1", sort="price"),
+    "filter_supplier_quantity": ItemQuery(supplier="Supplier 2", sort="quantity", descending=True),
+}
+
+def has_display():
+    return bool(os.environ.get("DISPLAY")) or sys.platform in ("win32", "darwin")
+
+@contextmanager
+def scratch_directory(prefix):
+    # Every benchmark gets its own database and ledger files, never the real ones
+    cwd = os.getcwd()
+    directory = tempfile.mkdtemp(prefix=prefix)
+    os.chdir(directory)
+    try:
+        yield directory
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory, ignore_errors=True)
+
+def median_ms(func, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def median_rate(func, count, repeat=5):
+    # An untimed warm-up run first, then the median of several, so one slow fsync doesn't set the figure
+    func()
+    return count / (median_ms(func, repeat) / 1000)
+
+def sample_rows(count, start=0):
+    for i in range(start, start + count):
+        yield (f"Item {i}", i % 500, round(1 + (i % 10000) / 7, 2), f"Category {i % 40}", f"Description of item {i}", f"Supplier {i % 25}")
+
+def fill(db, count):
+    batch = []
+    for row in sample_rows(count):
+        batch.append(row)
+        if len(batch) == 10000:
+            db.bulk_insert(batch)
+            batch = []
+    if batch:
+        db.bulk_insert(batch)
+
+def bench_load_items(db, size, results):
+    name = f"inventory.load_items.{size}"
+    if has_display():
+        # Real Treeview path: time from load_items() until the first page is on screen
+        import tkinter as tk
+        import stocks
+        root = tk.Tk()
+        app = stocks.InventoryApp(root)
+
+        def load():
+            generation = app.view_generation
+            app.load_items()
+            while app.view_generation == generation:
+                root.update()
+
+        load()
+        results[name] = {"value": median_ms(load), "unit": "ms", "better": "lower"}
+        app.close()
+    else:
+        # GUI-less path: the query load_items runs for the first screen of rows
+        results[name] = {"value": median_ms(lambda: db.fetch_page(limit=100), repeat=20), "unit": "ms", "better": "lower"}
+
+def bench_filters(db, size, results):
+    for name, query in FILTER_QUERIES.items():
+        results[f"inventory.{name}.{size}"] = {
+            "value": median_ms(lambda: db.fetch_page(query, limit=100, remember=False), repeat=10),
+            "unit": "ms", "better": "lower", "budget": FILTER_BUDGET_MS}
+
+def bench_inventory(sizes, results):
+    for size in sizes:
+        with scratch_directory("bench-inventory-"):
+            bench_inventory_size(size, results)
+
+def bench_inventory_size(size, results):
+    db = InventoryDB()
+    db.init_schema()
+    started = time.perf_counter()
+    fill(db, size)
+    results[f"inventory.bulk_insert.{size}"] = {"value": size / (time.perf_counter() - started), "unit": "rows/s", "better": "higher"}
+    bench_load_items(db, size, results)
+    bench_filters(db, size, results)
+
+    counter = iter(range(10 ** 9))
+    results[f"inventory.add_item.{size}"] = {
+        "value": median_ms(lambda: db.add_item(f"New {next(counter)}", 1, 1.0, "Bench", "Bench", "Bench"), repeat=50),
+        "unit": "ms", "better": "lower"}
+    results[f"inventory.update_item.{size}"] = {
+        "value": median_ms(lambda: db.update_item(size // 2, "Updated", next(counter) % 100, 2.0, "Bench", "Bench", "Bench"), repeat=50),
+        "unit": "ms", "better": "lower"}
+    ids = iter(range(1, size + 1))
+    results[f"inventory.delete_item.{size}"] = {"value": median_ms(lambda: db.delete_item(next(ids)), repeat=50), "unit": "ms", "better": "lower"}
+
+    started = time.perf_counter()
+    db.bulk_upsert(list(sample_rows(10000, size // 2)))
+    results[f"inventory.bulk_upsert.{size}"] = {"value": 10000 / (time.perf_counter() - started), "unit": "rows/s", "better": "higher"}
+    db.close()
+
+def bench_atm(operations, results):
+    with scratch_directory("bench-atm-"):
+        bench_atm_operations(operations, results)
+
+def bench_atm_operations(operations, results):
+    service = AccountService(Ledger())
+    service.open_account("1001", "1234", 10 ** 9)
+
+    def deposits():
+        for _ in range(operations):
+            service.deposit("1001", 100)
+
+    def withdrawals():
+        for _ in range(operations):
+            service.withdraw("1001", 500)
+
+    results["atm.deposit"] = {"value": median_rate(deposits, operations), "unit": "ops/s", "better": "higher"}
+    results["atm.withdraw"] = {"value": median_rate(withdrawals, operations), "unit": "ops/s", "better": "higher"}
+    service.close()
+
+# Time-to-interactive: the ATM window drawn, or the inventory window showing its first page
+STARTUP_SCRIPTS = {
+    "atm": ("import ATM",
+            "root = tk.Tk(); ATM.ATM(root); root.update()",
+            "ATM.load_default_service().close()"),
+    "stocks": ("import stocks",
+               "root = tk.Tk(); app = stocks.InventoryApp(root)\nwhile app.started is not None: root.update()",
+               "db = stocks.InventoryDB(); db.init_schema(); db.fetch_page(limit=stocks.PAGE_SIZE)"),
+}
+
+def startup_budgets():
+    import ATM
+    import stocks
+    return {"atm": ATM.STARTUP_BUDGET_MS, "stocks": stocks.STARTUP_BUDGET_MS}
+
+def bench_startup(results, repeat=3):
+    # Fresh interpreter each time so imports are included, as they are for a user launching the app
+    budgets = startup_budgets()
+    for name, (imports, gui, headless) in STARTUP_SCRIPTS.items():
+        body = f"import tkinter as tk; {gui}" if has_display() else headless
+        script = (f"import sys, time; started = time.perf_counter(); sys.path[:0] = [{ROOT!r}, {INVENTORY_DIR!r}]; "
+                  f"{imports}; {body}\nprint((time.perf_counter() - started) * 1000)")
+        timings = []
+        for _ in range(repeat):
+            with scratch_directory("bench-startup-"):
+                output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+            timings.append(float(output.stdout.strip().splitlines()[-1]))
+        results[f"startup.{name}"] = {"value": statistics.median(timings), "unit": "ms", "better": "lower", "budget": budgets[name]}
+
+def over_budget(results):
+    over = []
+    for name, result in sorted(results.items()):
+        if "budget" in result and result["value"] > result["budget"]:
+            print(f"{name} took {result['value']:.0f} {result['unit']}, over its {result['budget']} {result['unit']} budget")
+            over.append(name)
+    return over
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["value"], result["value"]
+        change = (after - before) / before if before else 0.0
+        worse = change > threshold if result["better"] == "lower" else change < -threshold
+        marker = "REGRESSION" if worse else ""
+        print(f"{name:40} {before:14.3f} -> {after:14.3f} {result['unit']:7} {change:+8.1%} {marker}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ATM and inventory hot paths and compare against a baseline.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma separated inventory row counts")
+    parser.add_argument("--atm-operations", type=int, default=2000)
+    parser.add_argument("--output", default=os.path.join(ROOT, "bench_results.json"))
+    parser.add_argument("--baseline", default=os.path.join(ROOT, "bench_baseline.json"))
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed relative slowdown, e.g. 0.2 for 20%%")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    args = parser.parse_args(argv)
+
+    results = {}
+    bench_inventory([int(size) for size in args.sizes.split(",")], results)
+    bench_atm(args.atm_operations, results)
+    bench_startup(results)
+
+    report = {"python": sys.version.split()[0], "gui": has_display(), "time": time.time(), "results": results}
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
+    over = over_budget(results)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 1 if over else 0
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against; run with --save-baseline first.")
+        return 1 if over else 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 1 if over else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
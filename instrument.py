@@ -0,0 +1,152 @@
+import atexit
+import cProfile
+import functools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import deque
+
+# Opt-in latency instrumentation. Turn it on with BRAINWAVE_PROFILE=1 or by starting ATM.py/stocks.py
+# with --profile; add BRAINWAVE_CPROFILE=1 or --cprofile to keep a cProfile of the slowest call of each
+# callback. When it is off, timed() and callback() hand back the undecorated function.
+ENABLED = os.environ.get("BRAINWAVE_PROFILE") == "1" or "--profile" in sys.argv
+CPROFILE = ENABLED and (os.environ.get("BRAINWAVE_CPROFILE") == "1" or "--cprofile" in sys.argv)
+OUTPUT_DIR = os.environ.get("BRAINWAVE_PROFILE_DIR", ".")
+DUMP_INTERVAL = float(os.environ.get("BRAINWAVE_PROFILE_INTERVAL", "10"))
+WINDOW = 2048
+STARTED = time.perf_counter()
+
+class Metric:
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=WINDOW)
+
+metrics = {}
+counters = {}
+slowest = {}
+lock = threading.Lock()
+profiling = threading.local()
+
+def record(name, seconds):
+    with lock:
+        metric = metrics.get(name)
+        if metric is None:
+            metric = metrics[name] = Metric()
+        metric.count += 1
+        metric.total += seconds
+        metric.samples.append(seconds)
+        if seconds > metric.max:
+            metric.max = seconds
+
+def count(name, amount=1):
+    if ENABLED:
+        with lock:
+            counters[name] = counters.get(name, 0) + amount
+
+def timed(name):
+    def decorate(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+def callback(name):
+    # Like timed(), and with cProfile enabled also profiles the call, keeping the slowest one seen
+    def decorate(func):
+        if not CPROFILE:
+            return timed(name)(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if getattr(profiling, "active", False):
+                return timed(name)(func)(*args, **kwargs)
+            profiler = cProfile.Profile()
+            profiling.active = True
+            started = time.perf_counter()
+            try:
+                return profiler.runcall(func, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                profiling.active = False
+                record(name, elapsed)
+                with lock:
+                    if elapsed > slowest.get(name, (0.0, None))[0]:
+                        slowest[name] = (elapsed, profiler)
+        return wrapper
+    return decorate
+
+def interactive(name, started, budget_ms):
+    # Time-to-interactive of a window, checked against its budget on every launch
+    elapsed = (time.perf_counter() - started) * 1000
+    if ENABLED:
+        record(name, elapsed / 1000)
+    if elapsed > budget_ms:
+        print(f"{name}: time to interactive {elapsed:.0f} ms is over the {budget_ms} ms budget", file=sys.stderr)
+    return elapsed
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def snapshot():
+    with lock:
+        items = [(name, metric.count, metric.total, metric.max, sorted(metric.samples)) for name, metric in metrics.items()]
+        current_counters = dict(counters)
+    summary = {}
+    for name, total_count, total, maximum, ordered in items:
+        summary[name] = {"count": total_count, "total_ms": total * 1000, "max_ms": maximum * 1000,
+                         "p50_ms": percentile(ordered, 0.50) * 1000, "p95_ms": percentile(ordered, 0.95) * 1000,
+                         "p99_ms": percentile(ordered, 0.99) * 1000}
+    return {"time": time.time(), "latency": summary, "counters": current_counters}
+
+def prometheus_name(name):
+    return "brainwave_" + "".join(c if c.isalnum() else "_" for c in name)
+
+def dump():
+    data = snapshot()
+    with open(os.path.join(OUTPUT_DIR, "metrics.json.tmp"), "w") as file:
+        json.dump(data, file, indent=2)
+    os.replace(os.path.join(OUTPUT_DIR, "metrics.json.tmp"), os.path.join(OUTPUT_DIR, "metrics.json"))
+
+    lines = []
+    for name, values in sorted(data["latency"].items()):
+        metric = prometheus_name(name) + "_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        for quantile in ("p50", "p95", "p99"):
+            lines.append(f'{metric}{{quantile="0.{quantile[1:]}"}} {values[quantile + "_ms"] / 1000:.6f}')
+        lines.append(f"{metric}_sum {values['total_ms'] / 1000:.6f}")
+        lines.append(f"{metric}_count {values['count']}")
+    for name, value in sorted(data["counters"].items()):
+        lines.append(f"# TYPE {prometheus_name(name)}_total counter")
+        lines.append(f"{prometheus_name(name)}_total {value}")
+    with open(os.path.join(OUTPUT_DIR, "metrics.prom.tmp"), "w") as file:
+        file.write("\n".join(lines) + "\n")
+    os.replace(os.path.join(OUTPUT_DIR, "metrics.prom.tmp"), os.path.join(OUTPUT_DIR, "metrics.prom"))
+
+    with lock:
+        profiles = [(name, profiler) for name, (_, profiler) in slowest.items()]
+    for name, profiler in profiles:
+        pstats.Stats(profiler).dump_stats(os.path.join(OUTPUT_DIR, f"profile-{name}.prof"))
+
+def dump_periodically():
+    while True:
+        time.sleep(DUMP_INTERVAL)
+        dump()
+
+if ENABLED:
+    threading.Thread(target=dump_periodically, daemon=True).start()
+    atexit.register(dump)
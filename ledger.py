@@ -0,0 +1,298 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal, ROUND_HALF_UP
+
+from instrument import timed, count
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+SNAPSHOT_EVERY = 1000
+
+class InsufficientFunds(Exception):
+    pass
+
+class UnknownAccount(Exception):
+    pass
+
+def to_minor(amount):
+    # Amounts are stored as whole paise so repeated deposits and withdrawals never drift
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+def from_minor(amount):
+    return amount / 100
+
+class Ledger:
+    # Append-only transaction log plus periodic snapshots. Each line of the log is one entry:
+    # seq, time, kind, account, amount in paise and counterparty, tab separated. The balance is
+    # rebuilt on startup from the latest snapshot and the entries written after it. The lock is held
+    # only to check and append; the fsync happens after it is released, and one fsync covers every
+    # entry appended up to that point, so concurrent sessions share fsyncs instead of queueing on them.
+    def __init__(self, path="ledger.log", snapshot_path="ledger.snapshot", lock_path="ledger.lock"):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.lock_path = lock_path
+        self.thread_lock = threading.RLock()
+        self.sync_lock = threading.Lock()
+        self.synced = 0
+        self.lock_file = open(self.lock_path, "a+b")
+        self.lock_depth = 0
+        self.batching = False
+        self.undo = {}
+        self.pending = []
+        self.balances = {}
+        self.seq = 0
+        self.offset = 0
+        self.since_snapshot = 0
+        self.load_snapshot()
+        self.log = open(self.path, "a+b")
+        with self.locked():
+            pass
+
+    def load_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return
+        with open(self.snapshot_path, "r") as file:
+            snapshot = json.load(file)
+        self.seq = snapshot["seq"]
+        self.offset = snapshot["offset"]
+        self.balances = snapshot["balances"]
+
+    @timed("file.ledger_write_snapshot")
+    def write_snapshot(self):
+        # Write-and-rename so a crash leaves either the old snapshot or the new one, never half of one
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump({"seq": self.seq, "offset": self.offset, "balances": self.balances}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        self.since_snapshot = 0
+
+    @contextmanager
+    def locked(self):
+        # Thread lock for this process, file lock for every other process sharing the ledger
+        with self.thread_lock:
+            if self.lock_depth == 0:
+                if fcntl:
+                    fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX)
+                else:
+                    self.lock_file.seek(0)
+                    msvcrt.locking(self.lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            self.lock_depth += 1
+            try:
+                if self.lock_depth == 1:
+                    self.catch_up(repair=True)
+                yield self
+            finally:
+                self.lock_depth -= 1
+                if self.lock_depth == 0:
+                    if fcntl:
+                        fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+                    else:
+                        self.lock_file.seek(0)
+                        msvcrt.locking(self.lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @timed("file.ledger_catch_up")
+    def catch_up(self, repair=False):
+        # Apply entries other processes appended since we last looked
+        self.log.seek(self.offset)
+        for line in self.log:
+            if not line.endswith(b"\n"):
+                if repair:
+                    # Only a writer that crashed mid-append leaves a partial line; drop it
+                    self.log.truncate(self.offset)
+                break
+            self.apply(line.decode("utf-8").rstrip("\n").split("\t"))
+            self.offset += len(line)
+            self.since_snapshot += 1
+
+    def apply(self, fields):
+        seq, _, kind, account, amount, counterparty = fields
+        amount = int(amount)
+        self.seq = int(seq)
+        if kind == "open" or kind == "reset":
+            self.balances[account] = amount
+        elif kind == "deposit":
+            self.balances[account] += amount
+        elif kind == "withdraw":
+            self.balances[account] -= amount
+        elif kind == "transfer":
+            self.balances[account] -= amount
+            # transfer() refuses unknown counterparties; logs written before it did may still hold some
+            if counterparty in self.balances:
+                self.balances[counterparty] += amount
+
+    @timed("file.ledger_append")
+    def append(self, kind, account, amount, counterparty=""):
+        # Returns the log offset to pass to commit(), or None inside a batch, which syncs on exit
+        fields = [str(self.seq + 1), f"{time.time():.3f}", kind, account, str(amount), counterparty]
+        line = ("\t".join(fields) + "\n").encode("utf-8")
+        if self.batching:
+            # Held in memory until the batch commits, so a crash mid-batch leaves none of it in the log
+            self.pending.append(line)
+            for name in (account, counterparty):
+                if name and name not in self.undo:
+                    self.undo[name] = self.balances.get(name)
+        else:
+            # Flushed before the file lock is released so other processes see the entry
+            self.log.seek(0, os.SEEK_END)
+            self.log.write(line)
+            self.log.flush()
+        self.apply(fields)
+        self.offset += len(line)
+        self.since_snapshot += 1
+        return None if self.batching else self.offset
+
+    def commit(self, offset):
+        # Group commit: call after releasing the lock. Whoever gets sync_lock first fsyncs everything
+        # appended so far, so the threads queued behind it usually find their entries already durable.
+        if offset is None:
+            return
+        with self.sync_lock:
+            if self.synced >= offset:
+                count("ledger.shared_fsync")
+                return
+            with self.thread_lock:
+                end = self.offset
+            self.fsync(end)
+        if self.since_snapshot >= SNAPSHOT_EVERY:
+            with self.locked():
+                self.sync()
+
+    @timed("file.ledger_sync")
+    def fsync(self, end):
+        os.fsync(self.log.fileno())
+        self.synced = max(self.synced, end)
+
+    def sync(self):
+        # Caller holds the lock
+        self.log.flush()
+        self.fsync(self.offset)
+        if self.since_snapshot >= SNAPSHOT_EVERY:
+            self.write_snapshot()
+
+    @contextmanager
+    def batch(self):
+        # Group commit: entries appended inside the block are applied in memory and reach the log in
+        # one write and one fsync when it exits. If the block raises they are undone and never written.
+        with self.locked():
+            start = (self.seq, self.offset, self.since_snapshot)
+            self.batching = True
+            self.undo = {}
+            self.pending = []
+            try:
+                try:
+                    yield self
+                finally:
+                    self.batching = False
+                if self.pending:
+                    self.log.seek(0, os.SEEK_END)
+                    self.log.write(b"".join(self.pending))
+                self.sync()
+            except BaseException:
+                self.rollback(*start)
+                raise
+            finally:
+                self.undo = {}
+                self.pending = []
+
+    def rollback(self, seq, offset, since_snapshot):
+        # Also drops whatever part of the group a failed write left in the file
+        self.log.truncate(offset)
+        for account, amount in self.undo.items():
+            if amount is None:
+                self.balances.pop(account, None)
+            else:
+                self.balances[account] = amount
+        self.seq, self.offset, self.since_snapshot = seq, offset, since_snapshot
+
+    @contextmanager
+    def reading(self):
+        # Shared file lock for reads, so another process can't be mid-write or mid-rollback while we catch up
+        with self.thread_lock:
+            if self.lock_depth or not fcntl:
+                with self.locked():
+                    yield self
+                return
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_SH)
+            try:
+                self.catch_up()
+                yield self
+            finally:
+                fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+
+    def balance(self, account):
+        with self.reading():
+            if account not in self.balances:
+                raise UnknownAccount(account)
+            return self.balances[account]
+
+    def has_account(self, account):
+        with self.reading():
+            return account in self.balances
+
+    def open_account(self, account, amount):
+        offset = None
+        with self.locked():
+            if account not in self.balances:
+                offset = self.append("open", account, amount)
+            balance = self.balances[account]
+        self.commit(offset)
+        return balance
+
+    def deposit(self, account, amount):
+        with self.locked():
+            if account not in self.balances:
+                raise UnknownAccount(account)
+            offset = self.append("deposit", account, amount)
+            balance = self.balances[account]
+        self.commit(offset)
+        return balance
+
+    def withdraw(self, account, amount):
+        with self.locked():
+            if self.balances.get(account, 0) < amount:
+                raise InsufficientFunds(account)
+            offset = self.append("withdraw", account, amount)
+            balance = self.balances[account]
+        self.commit(offset)
+        return balance
+
+    def transfer(self, account, to_account, amount):
+        with self.locked():
+            if to_account not in self.balances:
+                raise UnknownAccount(to_account)
+            if self.balances.get(account, 0) < amount:
+                raise InsufficientFunds(account)
+            offset = self.append("transfer", account, amount, to_account)
+            balance = self.balances[account]
+        self.commit(offset)
+        return balance
+
+    def reset(self, account, amount):
+        with self.locked():
+            offset = self.append("reset", account, amount)
+            balance = self.balances[account]
+        self.commit(offset)
+        return balance
+
+    def history(self, account=None):
+        with open(self.path, "rb") as file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    return
+                seq, timestamp, kind, entry_account, amount, counterparty = line.decode("utf-8").rstrip("\n").split("\t")
+                if account is None or account in (entry_account, counterparty):
+                    yield int(seq), float(timestamp), kind, entry_account, int(amount), counterparty
+
+    def close(self):
+        with self.thread_lock:
+            self.log.close()
+            self.lock_file.close()
@@ -0,0 +1,95 @@
+import queue
+import threading
+
+class Task:
+    def __init__(self, func, on_done, on_error, key):
+        self.func = func
+        self.on_done = on_done
+        self.on_error = on_error
+        self.key = key
+
+class TaskRunner:
+    # Runs blocking work (SQLite, file writes) on one worker thread and hands results back to the
+    # Tk thread through a queue polled with root.after, so callbacks always run on the Tk thread.
+    def __init__(self, root, on_busy=None, on_error=None, poll_ms=20):
+        self.root = root
+        self.on_busy = on_busy
+        self.on_error = on_error
+        self.poll_ms = poll_ms
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        self.queued = {}
+        self.lock = threading.Lock()
+        self.outstanding = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+        self.poll_job = self.root.after(self.poll_ms, self.poll)
+
+    def submit(self, func, on_done=None, on_error=None, key=None):
+        # A task submitted with the key of one that is still waiting replaces it instead of queueing again
+        with self.lock:
+            task = self.queued.get(key) if key is not None else None
+            if task is not None:
+                task.func, task.on_done, task.on_error = func, on_done, on_error
+                return
+            task = Task(func, on_done, on_error, key)
+            if key is not None:
+                self.queued[key] = task
+        self.outstanding += 1
+        if self.outstanding == 1 and self.on_busy:
+            self.on_busy(True)
+        self.tasks.put(task)
+
+    def post(self, func, *args):
+        # Safe from any thread: run func(*args) on the Tk thread at the next poll
+        self.results.put((func, args))
+
+    def worker(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            with self.lock:
+                if task.key is not None:
+                    self.queued.pop(task.key, None)
+                func, on_done, on_error = task.func, task.on_done, task.on_error
+            try:
+                result = func()
+            except Exception as e:
+                self.results.put((self.finish, (on_error or self.on_error, e)))
+            else:
+                self.results.put((self.finish, (on_done, result)))
+
+    def finish(self, callback, value):
+        self.outstanding -= 1
+        if self.outstanding == 0 and self.on_busy:
+            self.on_busy(False)
+        if callback:
+            callback(value)
+
+    def poll(self):
+        try:
+            while True:
+                try:
+                    func, args = self.results.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    func(*args)
+                except Exception as e:
+                    # A failing callback is reported like a failing task and the queue keeps draining
+                    if self.on_error:
+                        self.on_error(e)
+        finally:
+            if not self.closed:
+                self.poll_job = self.root.after(self.poll_ms, self.poll)
+
+    def close(self):
+        # Lets queued work (pending writes in particular) finish before the window goes away
+        if self.closed:
+            return
+        self.closed = True
+        self.root.after_cancel(self.poll_job)
+        self.tasks.put(None)
+        self.thread.join()
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from ledger import Ledger
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Opens a batch, makes 1000 deposits and dies before the batch exits
+CRASH_MID_BATCH = """
+import os, sys
+sys.path.insert(0, {root!r})
+from ledger import Ledger
+ledger = Ledger()
+with ledger.batch():
+    for _ in range(1000):
+        ledger.deposit("1001", 100)
+    os._exit(1)
+"""
+
+class LedgerBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_crash_mid_batch_leaves_nothing(self):
+        ledger = Ledger()
+        ledger.open_account("1001", 1000)
+        ledger.close()
+
+        result = subprocess.run([sys.executable, "-c", CRASH_MID_BATCH.format(root=ROOT)])
+        self.assertEqual(result.returncode, 1)
+
+        ledger = Ledger()
+        self.assertEqual(ledger.balance("1001"), 1000)
+        ledger.deposit("1001", 5)
+        ledger.close()
+        self.assertEqual(Ledger().balance("1001"), 1005)
+
+    def test_raising_batch_is_rolled_back(self):
+        ledger = Ledger()
+        ledger.open_account("1001", 1000)
+        with self.assertRaises(RuntimeError):
+            with ledger.batch():
+                ledger.deposit("1001", 100)
+                raise RuntimeError("stop")
+        self.assertEqual(ledger.balance("1001"), 1000)
+        ledger.close()
+        self.assertEqual(Ledger().balance("1001"), 1000)
+
+    def test_batch_is_durable_on_exit(self):
+        ledger = Ledger()
+        ledger.open_account("1001", 1000)
+        with ledger.batch():
+            for _ in range(10):
+                ledger.deposit("1001", 100)
+        ledger.close()
+        self.assertEqual(Ledger().balance("1001"), 2000)
+
+if __name__ == "__main__":
+    unittest.main()